@@ -0,0 +1,176 @@
+"""
+Generate
+
+Synthetic application trackers for benchmarking. Each tracker has the three sheets the app
+reads (Tracker, Interviews, ROE Calculation) with the columns in sections/constants.py and
+the real status vocabulary, and is written both as an .xlsx workbook and as Parquet files.
+
+To run from command line: python -m bench.generate --sizes 1k,100k,1M
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+
+DATA_DIR = "bench/data"
+SIZES = ["1k", "100k", "1M"]
+
+# Status vocabulary with rough real-world frequencies
+STATUSES = {
+    "Pending": 0.30,
+    "No Response": 0.18,
+    "Denied": 0.14,
+    "Rejected": 0.12,
+    "Closed": 0.04,
+    "Viewed": 0.04,
+    "Ghosted": 0.06,
+    "Interviewing": 0.04,
+    "Bailed": 0.02,
+    "On Hold": 0.02,
+    "Selected Out": 0.01,
+    "No Offer": 0.02,
+    "Offer": 0.01,
+}
+# Statuses that come with interviews
+INTERVIEWED = ["Rejected", "Ghosted", "Interviewing", "Bailed", "On Hold", "No Offer", "Offer"]
+
+INDUSTRIES = [f"Industry {i}" for i in range(1, 9)]
+ROLE_TYPES = [f"Role {i}" for i in range(1, 7)]
+PLATFORMS = [f"Platform {i}" for i in range(1, 7)]
+COMPANY_SIZES = ["Startup", "Midsize", "Fortune 500"]
+COVER_LETTERS = ["Yes", "No", "Tailored"]
+RESUMES = [f"Resume {i}" for i in range(1, 6)]
+INTERVIEW_TYPES = ["Introduction", "Behavioral", "Technical", "Case Study", "Final"]
+LOCATIONS = ["Virtual", "Phone Call", "In Person"]
+
+# ---------------------------------------- FUNCTIONS
+
+# "1k" -> 1000, "1M" -> 1000000
+def parse_size(size):
+    size = size.strip()
+    scale = {"k": 1_000, "M": 1_000_000}.get(size[-1], 1)
+    return int(float(size.rstrip("kM")) * scale)
+
+def tracker(rows, seed=0):
+    """
+    Builds a synthetic tracker.
+
+    Args:
+        rows: Number of applications
+        seed: Random seed, the same seed always gives the same tracker
+    Returns:
+        A dict of sheet name -> DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    n_companies = max(1, int(rows / 1.2))
+    company_ids = rng.integers(1, n_companies + 1, rows)
+
+    # Applications spread over ~5 per day, starting on a Monday
+    start = pd.Timestamp("2025-01-06")
+    dates = start + pd.to_timedelta(np.sort(rng.integers(0, max(1, rows // 5), rows)), unit="D")
+
+    status_names = list(STATUSES)
+    weights = np.array(list(STATUSES.values()))
+    status = np.array(status_names)[rng.choice(len(status_names), rows, p=weights / weights.sum())]
+
+    responded = ~np.isin(status, ["Pending", "No Response"])
+    response_days = np.where(responded, rng.gamma(2.0, 15.0, rows).round(), np.nan)
+    interviewed = np.isin(status, INTERVIEWED)
+    n_interviews = np.where(interviewed, rng.integers(1, 6, rows), np.nan)
+
+    salary_min = rng.integers(50, 90, rows)
+    salary_max = salary_min + rng.integers(10, 60, rows)
+    companies = np.char.add("Company ", company_ids.astype(str))
+
+    apps = pd.DataFrame({
+        "Company": companies,
+        "Job Title": np.char.add("Title ", company_ids.astype(str)),
+        "Industry": rng.choice(INDUSTRIES, rows),
+        "Role Type": rng.choice(ROLE_TYPES, rows),
+        "Date": dates,
+        "Cover Letter": rng.choice(COVER_LETTERS, rows),
+        "Status": status,
+        "Salary Min": salary_min,
+        "Salary Max": salary_max,
+        "Platform": rng.choice(PLATFORMS, rows),
+        "Company Size": rng.choice(COMPANY_SIZES, rows),
+        "Response Date": dates + pd.to_timedelta(response_days, unit="D"),
+        "Response Time (Days)": response_days,
+        "Number of Interviews": n_interviews,
+        "Week": ((dates - start).days // 7 + 1).astype(np.int64),
+        "Month": dates.month.astype(str) + "/" + dates.strftime("%y"),
+        "Resume ID": rng.choice(RESUMES, rows),
+    })
+
+    # One Interviews row per interview, rounds counting up from 1 for each application
+    interview_apps = np.flatnonzero(interviewed)
+    repeats = n_interviews[interview_apps].astype(np.int64)
+    rows_idx = np.repeat(interview_apps, repeats)
+    rounds = np.arange(len(rows_idx)) - np.repeat(np.cumsum(repeats) - repeats, repeats) + 1
+    interviews = pd.DataFrame({
+        "Company": companies[rows_idx],
+        "Role Type": apps["Role Type"].to_numpy()[rows_idx],
+        "Date": apps["Response Date"].to_numpy()[rows_idx] + pd.to_timedelta(rounds * 7, unit="D"),
+        "Round": rounds,
+        "Type of Interview": rng.choice(INTERVIEW_TYPES, len(rows_idx)),
+        "Location": rng.choice(LOCATIONS, len(rows_idx)),
+        "Performance": rng.integers(1, 6, len(rows_idx)),
+        "Experience": rng.integers(1, 6, len(rows_idx)),
+        "State": "Complete",
+    })
+
+    # ROE Calculation, one row per application in the same order
+    role = rng.choice([0.5, 0.6, 0.7, 0.8, 0.9], rows)
+    industry = rng.choice([0.7, 0.8, 0.9], rows)
+    spread = np.where(salary_max - salary_min > 40, 0.6, 0.8)
+    chance = role * industry * spread * 0.95
+    platform_effort = rng.choice([0.3, 0.4, 0.5], rows)
+    effort = 0.5 * 0.3 + platform_effort * 0.7 + np.nan_to_num(n_interviews) * 0.1
+    roe = pd.DataFrame({
+        "Company Name": companies,
+        "Job Title": apps["Job Title"],
+        "Application Status": status,
+        "Salary Average (Min+Max/2)": (salary_min + salary_max) / 2,
+        "Salary Spread": spread,
+        "Role Likeliness": role,
+        "Salary Likeliness": 0.95,
+        "Industry Likeliness": industry,
+        "Status Effort": 0.5,
+        "Platform Effort": platform_effort,
+        "Interview Weight": np.nan_to_num(n_interviews).astype(np.int64) + 1,
+        "Chance of Success": chance,
+        "Application Effort": effort,
+        "ROE": chance / effort,
+    })
+    return {"Tracker": apps[constants.APPS_COLUMNS + ["Job Title"]], "Interviews": interviews, "ROE Calculation": roe}
+
+def write(sheets, name, data_dir=DATA_DIR, excel=True):
+    """
+    Writes a tracker as data_dir/<name>.xlsx and data_dir/<name>/<sheet>.parquet.
+    """
+    os.makedirs(os.path.join(data_dir, name), exist_ok=True)
+    for sheet, df in sheets.items():
+        df.to_parquet(os.path.join(data_dir, name, sheet + ".parquet"), index=False)
+    if excel:
+        with pd.ExcelWriter(os.path.join(data_dir, name + ".xlsx"), engine="openpyxl") as writer:
+            for sheet, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic application trackers.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="Comma-separated row counts, ex: 1k,100k,1M")
+    parser.add_argument("--out", default=DATA_DIR, help="Output folder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-excel", action="store_true", help="Only write Parquet (Excel is slow at 1M rows)")
+    args = parser.parse_args(argv)
+
+    for size in args.sizes.split(","):
+        sheets = tracker(parse_size(size), args.seed)
+        write(sheets, "tracker_" + size.strip(), args.out, excel=not args.no_excel)
+        print(f"Wrote tracker_{size.strip()}: " + ", ".join(f"{k} {len(v)} rows" for k, v in sheets.items()))
+
+if __name__ == "__main__":
+    main()
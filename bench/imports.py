@@ -0,0 +1,79 @@
+"""
+Import-time budget
+
+Cold start cost of the app: imports everything roe_model.py imports at the top level in a fresh
+interpreter, the way a new server process does before the first page renders. Fails when that
+takes longer than the budget, or when a library that only some pages need gets imported at startup.
+
+To run from command line: python -m bench.imports [--budget seconds]
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+
+APP_FILE = "roe_model.py"
+# Seconds, fastest of RUNS - some headroom over streamlit and pandas, which take ~0.9s on their own
+BUDGET_SECONDS = 1.25
+# Only imported by the pages (or the parser) that use them
+LAZY_MODULES = ["altair", "streamlit_vertical_slider", "openpyxl", "matplotlib", "sections.breakdown", "sections.interviews", "sections.roe"]
+RUNS = 3
+
+# Runs in the fresh interpreter: times the imports and lists the lazy modules that got loaded
+PROBE = """
+import importlib, json, sys, time
+modules, lazy = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+start = time.perf_counter()
+for module in modules:
+    importlib.import_module(module)
+print(json.dumps({"seconds": time.perf_counter() - start, "loaded": [m for m in lazy if m in sys.modules]}))
+"""
+
+# ---------------------------------------- FUNCTIONS
+
+def startup_modules(path=APP_FILE):
+    """
+    The modules a script imports at the top level, in order.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            # "from sections import loader" imports the submodule sections.loader
+            modules += [node.module + "." + alias.name for alias in node.names] if node.module == "sections" else [node.module]
+    return list(dict.fromkeys(modules))
+
+def measure(modules, runs=RUNS):
+    """
+    Imports modules in fresh interpreters. Returns the fastest run's seconds and the lazy modules it loaded.
+    """
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE, json.dumps(modules), json.dumps(LAZY_MODULES)],
+                             capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the app's cold-start import time.")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="Allowed seconds (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    modules = startup_modules()
+    result = measure(modules)
+    print(f"Startup imports: {result['seconds']:.2f}s (budget {args.budget:.2f}s) - {', '.join(modules)}")
+    failed = False
+    if result["seconds"] > args.budget:
+        print("FAIL: over the import-time budget")
+        failed = True
+    if result["loaded"]:
+        print("FAIL: imported at startup but only needed by some pages: " + ", ".join(result["loaded"]))
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Benchmarks
+
+Times the analysis hot paths on the trackers written by bench/generate.py and stores the
+results per commit in bench/results/, so runs can be compared to catch regressions.
+
+To run from command line: python -m bench.run --compare bench/results/<older commit>.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import altair as alt
+import pandas as pd
+
+import sections.aggregate as aggregate
+import sections.charts as charts
+import sections.constants as constants
+import sections.dates as dates
+import sections.filters as filters
+import sections.funnel as funnel
+import sections.loader as loader
+import sections.methods as methods
+import sections.metrics as metrics
+import sections.schema as schema
+import sections.scoring as scoring
+import sections.sweep as sweep
+import sections.timeseries as timeseries
+from bench.generate import DATA_DIR
+
+RESULTS_DIR = "bench/results"
+# A benchmark is a regression when it gets this much slower than the compared run
+REGRESSION_RATIO = 1.25
+
+# ---------------------------------------- FUNCTIONS
+
+def timeit(fn, repeat):
+    """
+    Runs fn `repeat` times. Returns the min and median wall time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat}
+
+# Sheets in the compact schema with the date dimension, like the app loads them
+def read_parquet(folder):
+    paths = {sheet: os.path.join(folder, sheet + ".parquet") for sheet in loader.SHEETS}
+    return dates.add_dates(schema.compact_sheets({sheet: pd.read_parquet(path) if os.path.exists(path) else None for sheet, path in paths.items()}))
+
+# Fresh model every call, so nothing is served from its cached properties
+def fresh(sheets):
+    return metrics.Metrics(sheets["Tracker"], sheets["Interviews"], sheets["ROE Calculation"])
+
+def chart_specs(model):
+    """
+    Builds the Altair specs of the heaviest charts, the way the pages do.
+    """
+    hist = alt.Chart(model.response_distribution.histogram(3, "Response Time (Days)")).mark_bar().encode(
+        alt.X("Response Time (Days):Q", bin=alt.Bin(binned=True, step=3)),
+        x2="Response Time (Days)_end:Q",
+        y=alt.Y("count:Q"),
+    )
+    scatter = alt.Chart(charts.project(model.roe_formatted, ["Application Number", "Company Name", "Application Status", "Chance of Success"])).mark_circle(size=60).encode(
+        x=alt.X("Application Number:Q"),
+        y=alt.Y("Chance of Success:Q"),
+        color=alt.Color("Application Status:N"),
+        tooltip=["Application Number", "Company Name", "Application Status", "Chance of Success"]
+    )
+    heatmap = alt.Chart(charts.project(model.interview_days, ["week", "day", "count"])).mark_rect().encode(
+        x=alt.X('week:O'), y=alt.Y('day:O'), color=alt.Color('count:Q')
+    )
+    return [chart.to_dict() for chart in [hist, scatter, heatmap]]
+
+def benchmarks(name, data_dir, repeat):
+    """
+    The benchmarks of one generated tracker, as (name, function, repeat) tuples.
+    """
+    sheets = read_parquet(os.path.join(data_dir, name))
+    apps = sheets["Tracker"]
+    excel = os.path.join(data_dir, name + ".xlsx")
+    rows = len(apps)
+    # Excel parsing is slow, so large workbooks are only parsed once
+    excel_repeat = repeat if rows <= 10_000 else 1
+
+    if os.path.exists(excel):
+        sidecar_dir = tempfile.mkdtemp(prefix="bench-sidecar-")
+        with open(excel, "rb") as f:
+            data = f.read()
+        digest = loader.bytes_key(data)
+        loader.write_sidecar(digest, loader.read_workbook(excel), sidecar_dir)
+        yield "load_excel", lambda: loader.read_workbook(excel), excel_repeat
+        yield "load_sidecar", lambda: loader.read_sidecar(digest, sidecar_dir), repeat
+    yield "groupby_percents", lambda: methods.groupby_percents(apps, "Industry"), repeat
+    yield "grouping_sets", lambda: aggregate.grouping_sets(apps, metrics.BREAKDOWN_DIMS), repeat
+    yield "groupby_smaller", lambda: methods.groupby_smaller(apps, "Role Type", "Status", "Applications In Status", "Applications In Status"), repeat
+    yield "validate_columns", lambda: methods.validate_columns(apps, constants.APPS_COLUMNS), repeat
+    yield "interview_cube", lambda: aggregate.rollup(sheets["Interviews"], metrics.INTERVIEW_DIMS, metrics.INTERVIEW_MEASURES, dropna=False), repeat
+    yield "interview_groupbys", lambda: fresh(sheets).interview_tables, repeat
+    cube = aggregate.cube(sheets["Interviews"], metrics.INTERVIEW_DIMS, metrics.INTERVIEW_MEASURES)
+    yield "interview_drilldown", lambda: aggregate.from_cube(cube, "Location", metrics.INTERVIEW_MEASURES, {"Round": [1, 2]}), repeat
+    yield "funnel_build", lambda: funnel.Funnel(apps, sheets["Interviews"]), repeat
+    hiring = funnel.Funnel(apps, sheets["Interviews"])
+    yield "funnel_table", lambda: hiring.table(), repeat
+    feats = scoring.Features(apps)
+    yield "roe_features", lambda: scoring.Features(apps), repeat
+    yield "roe_score", lambda: scoring.score(feats), repeat
+    yield "roe_sheet", lambda: scoring.roe_sheet(apps), repeat
+    yield "weight_grid", lambda: sweep.grid(feats, configurations=1000), repeat
+    weights_grid = sweep.grid(feats, configurations=200)
+    # Picked weights have to score the separation they were ranked with
+    mismatched = sweep.check(apps, weights_grid, sweep.sweep(apps, weights_grid, workers=1))
+    if mismatched:
+        raise AssertionError(f"Sweep configurations {mismatched} don't reproduce their separation")
+    yield "weight_sweep", lambda: sweep.sweep(apps, weights_grid, workers=1), max(1, repeat // 2)
+    yield "heatmap_prep", lambda: fresh(sheets).interview_days, repeat
+    yield "metrics_model", lambda: [getattr(fresh(sheets), attr) for attr in ["tables", "weekly", "status_table", "real_response_average", "chance_accuracy"]], repeat
+    timeline = timeseries.TimeSeries(apps, sheets["Interviews"])
+    middle = timeline.first + (timeline.last - timeline.first) // 2
+    yield "timeseries_build", lambda: timeseries.TimeSeries(apps, sheets["Interviews"]), repeat
+    yield "date_window", lambda: (timeline.window(middle, timeline.last), timeline.rolling(4)), repeat
+    yield "date_rows", lambda: timeline.app_rows.between(middle, timeline.last), repeat
+    distribution = charts.Distribution(apps["Response Time (Days)"])
+    yield "distribution_build", lambda: charts.Distribution(apps["Response Time (Days)"]), repeat
+    yield "histogram_steps", lambda: [distribution.histogram(step, "Response Time (Days)") for step in range(1, 11)], repeat
+    index = filters.FilterIndex(apps)
+    picked = {col: index.values[col][:2] for col in ["Industry", "Status", "Cover Letter"] if col in index.values}
+    yield "filter_index", lambda: filters.FilterIndex(apps), repeat
+    yield "filter_mask", lambda: index.mask(picked), repeat
+    yield "altair_specs", lambda: chart_specs(fresh(sheets)), max(1, repeat // 2)
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(data_dir=DATA_DIR, repeat=5, only=None):
+    """
+    Times every benchmark on every generated tracker in data_dir.
+
+    Returns:
+        A dict with the commit, machine info and {tracker: {benchmark: timings}}
+    """
+    alt.data_transformers.disable_max_rows()
+    trackers = sorted(
+        entry.name for entry in os.scandir(data_dir) if entry.is_dir() and os.path.exists(os.path.join(entry.path, "Tracker.parquet"))
+    )
+    results = {}
+    for name in trackers:
+        results[name] = {}
+        for bench, fn, times in benchmarks(name, data_dir, repeat):
+            if only and bench not in only:
+                continue
+            results[name][bench] = timeit(fn, times)
+            print(f"{name:>16} {bench:<20} {results[name][bench]['min'] * 1000:10.2f} ms")
+    return {
+        "commit": commit(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+def compare(current, previous, ratio=REGRESSION_RATIO):
+    """
+    Prints the change of every benchmark against a previous run.
+
+    Returns:
+        The list of (tracker, benchmark, slowdown) regressions beyond ratio
+    """
+    regressions = []
+    print(f"\nCompared to {previous['commit']} ({previous['date']}):")
+    for name, benches in current["results"].items():
+        for bench, timing in benches.items():
+            before = previous["results"].get(name, {}).get(bench)
+            if before is None:
+                continue
+            change = timing["min"] / before["min"] if before["min"] else float("inf")
+            flag = " <- REGRESSION" if change > ratio else ""
+            print(f"{name:>16} {bench:<20} {change:6.2f}x{flag}")
+            if change > ratio:
+                regressions.append((name, bench, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths.")
+    parser.add_argument("--data", default=DATA_DIR, help="Folder written by bench.generate")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default=None, help="Comma-separated benchmark names")
+    parser.add_argument("--compare", default=None, help="Results file of an earlier run")
+    parser.add_argument("--out", default=RESULTS_DIR, help="Folder to store results in")
+    args = parser.parse_args(argv)
+
+    current = run(args.data, args.repeat, args.only.split(",") if args.only else None)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, current["commit"] + ".json")
+    with open(path, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
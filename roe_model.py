@@ -1,22 +1,46 @@
 import streamlit as st
-import pandas as pd
+import importlib
 import os
 
-# Import pages
-from sections import intro
-from sections import breakdown
-from sections import interviews
-from sections import roe
-from sections import glossary
+# Pages are imported on first visit (see page_module), the rest is needed by every run
 from sections import constants
-from sections import methods
+from sections import filters
+from sections import loader
+from sections import metrics
+from sections import profiling
+from sections import scoring
+from sections import snapshot
 
 DEFAULT_FILE = "excel/example_app_tracker.xlsx"
 REAL_FILE = "excel/app_tracker.xlsx"
 
+# Module of each page. Importing a page pulls in its charting libraries, so a cold start only pays for the page that is shown
+PAGE_MODULES = {
+    "Introduction": "intro",
+    "Application Data": "breakdown",
+    "Interviews": "interviews",
+    "ROE": "roe",
+    "Glossary": "glossary",
+}
+
+def page_module(page):
+    return importlib.import_module("sections." + PAGE_MODULES[page])
+
 # Wide mode
 st.set_page_config(layout="wide", page_title="Application Data")
 
+# Opt-in profiling: add ?profile=1 to the URL. Memory is only traced when the server enables it
+profiling.start(st.query_params.get("profile") == "1" or profiling.enabled_by_env(), memory=profiling.enabled_by_env())
+
+# Picking a color only reruns the pickers, not the whole app. Picks are kept in session state
+@st.fragment
+def color_pickers():
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        st.color_picker("Color 1", constants.COLOR1, key="color1")
+    with c2:
+        st.color_picker("Color 2:", constants.COLOR2, key="color2")
+
 # ---- Sidebar Navigation ----
 header1, header2, header3 = st.columns([3,1,2], gap='large')
 with header1:
@@ -27,13 +51,9 @@ with header1:
     st.text("Since I was laid off in April 2025, I've been hard at work applying to new roles. This project is a capstone presentation of all of the data I've collected showcasing my data visualization skills.")
     st.text("Example data is loaded on the public application - please ask for the master data set to see my actual application journey.")
     st.text("Choose the colors for the graphs:")
-    c1, c2, c3, c4 = st.columns(4)
-    with c1:
-        color1 = st.color_picker("Color 1", constants.COLOR1)
-    with c2:
-        color2 = st.color_picker("Color 2:", constants.COLOR2)
+    color_pickers()
     # CHART COLORS
-    gradient = [color1, color2]
+    gradient = [st.session_state.color1, st.session_state.color2]
     barcolor = "turbo"
 
 # Checks whether the data is mine
@@ -43,10 +63,10 @@ grahams = False
 with header3:
 # User upload
     st.write("#")
-    uploaded_file = st.file_uploader(
-        "Upload your own application tracker here:", 
+    uploaded_files = st.file_uploader(
+        "Upload your own application tracker here (several trackers are analyzed together):", 
         type=["xlsx", "xls"],
-        accept_multiple_files=False)
+        accept_multiple_files=True)
     st.download_button(
         label="Don't have the template yet? Download it here!",
         data="csv",
@@ -54,79 +74,122 @@ with header3:
         mime="text/csv",
         icon=":material/download:",
     )
-    # Load data
-    if uploaded_file is not None:
-        st.success("✅ Uploaded file.")
+    # Load data - each workbook is parsed once and cached across reruns and sessions.
+    # The example workbook comes precomputed from its snapshot when one was built
+    snapshot.install(DEFAULT_FILE)
+    if uploaded_files:
+        st.success("✅ Uploaded file." if len(uploaded_files) == 1 else f"✅ Uploaded {len(uploaded_files)} files.")
+        _, default_sheets = loader.load_workbook(DEFAULT_FILE)
         try:
-            apps = pd.read_excel(uploaded_file, sheet_name="Tracker")
+            if len(uploaded_files) == 1:
+                # A file uploaded again in this session is updated from its previous version
+                _, sheets = loader.load_workbook(uploaded_files[0], st.session_state.setdefault("tracker_versions", {}))
+            else:
+                # Cohort - files are parsed in parallel and stacked with a Source column
+                _, sheets, skipped = loader.load_cohort(uploaded_files)
+                if skipped:
+                    st.error("❌ Could not read: " + ", ".join(skipped))
         except:
-            apps = pd.read_excel(DEFAULT_FILE, sheet_name="Tracker")
+            sheets = {}
+        apps = sheets.get("Tracker")
+        if apps is None:
+            apps = default_sheets["Tracker"]
             st.error("❌ Sheet called 'Tracker' not found. Default data is used.")
-        try:
-            calc = pd.read_excel(uploaded_file, sheet_name="ROE Calculation")
-        except:
-            calc = pd.read_excel(DEFAULT_FILE, sheet_name="ROE Calculation")
-            st.error("❌ Sheet called 'ROE Calculation' not found. Default data is used.")
-        try:
-            interview = pd.read_excel(uploaded_file, sheet_name="Interviews")
-        except:
-            interview = pd.read_excel(DEFAULT_FILE, sheet_name="Interviews")
-            st.error("❌ Sheet called 'ROE Calculation' not found. Default data is used.")
+        # Without a ROE Calculation sheet, the scores are computed from the uploaded Tracker (see below)
+        calc = sheets.get("ROE Calculation") if sheets.get("Tracker") is not None else default_sheets["ROE Calculation"]
+        weights = sheets.get("Weights")
+        interview = sheets.get("Interviews")
+        if interview is None:
+            interview = default_sheets["Interviews"]
+            st.error("❌ Sheet called 'Interviews' not found. Default data is used.")
     elif os.path.exists(REAL_FILE):
-        apps = pd.read_excel(REAL_FILE, sheet_name="Tracker")
-        calc = pd.read_excel(REAL_FILE, sheet_name="ROE Calculation")
-        interview = pd.read_excel(REAL_FILE, sheet_name="Interviews")
+        _, sheets = loader.load_workbook(REAL_FILE, st.session_state.setdefault("tracker_versions", {}))
+        apps = sheets["Tracker"]
+        calc = sheets["ROE Calculation"]
+        weights = sheets["Weights"]
+        interview = sheets["Interviews"]
         st.info("ℹ️ Running app locally with app_tracker.xlsx.")
         grahams = True
     else:
-        apps = pd.read_excel(DEFAULT_FILE, sheet_name="Tracker")
-        calc = pd.read_excel(DEFAULT_FILE, sheet_name="ROE Calculation")
-        interview = pd.read_excel(DEFAULT_FILE, sheet_name="Interviews")
-        st.warning("⚠️ Master data set not found. Using default example data. If you uploaded an Excel file, make sure you have 3 sheets named: Tracker, ROE Calculation, Interviews")
-    
+        _, default_sheets = loader.load_workbook(DEFAULT_FILE)
+        apps = default_sheets["Tracker"]
+        calc = default_sheets["ROE Calculation"]
+        weights = default_sheets["Weights"]
+        interview = default_sheets["Interviews"]
+        st.warning("⚠️ Master data set not found. Using default example data. If you uploaded an Excel file, make sure you have sheets named: Tracker, Interviews (ROE Calculation and Weights are optional)")
+    # A ROE Calculation sheet that's missing or wasn't filled down is scored in the app instead
+    roe_sheet = calc
+    calc = scoring.current(apps, roe_sheet, weights)
+    if calc is not roe_sheet:
+        st.info("ℹ️ The ROE Calculation sheet is missing or out of date, so ROE scores are computed from the Tracker and Weights sheets.")
+
+# Every page renders from the same metrics model, built once per dataset
+model = metrics.model(apps, interview, calc)
+profiling.frame("Tracker", apps)
+profiling.frame("Interviews", interview)
+profiling.frame("ROE Calculation", calc)
+
 st.write("#")
 st.html("<hr style='border: 5px solid black; border-radius: 5px'>")
 
 # Navbar!
 st.sidebar.title("Navigation")
-pages = [
-    "Introduction",
-    "Application Data",
-    "Interviews",
-    "ROE",
-    "Glossary"
-]
-page = st.sidebar.radio("Go to", pages)
+page = st.sidebar.radio("Go to", list(PAGE_MODULES))
+
+# Date range and filter bar - every page is scoped to the applications and interviews in them.
+# Scoped models are cut from the dataset's time series and filter bitmaps, and kept, so moving
+# the range or changing filters back and forth is cheap
+window = (None, None)
+try:
+    first_date, last_date = model.date_range
+    date_range = st.sidebar.slider("Date range", min_value=first_date, max_value=last_date, value=(first_date, last_date), format="MMM D, YYYY")
+    if date_range != (first_date, last_date):
+        window = date_range
+except:
+    pass
+picked = {}
+with st.sidebar.expander("Filters"):
+    filter_index = filters.index(apps)
+    for col in filter_index.columns:
+        picked[col] = st.multiselect(col, filter_index.values[col])
+if window != (None, None) or filters.key(picked):
+    model = metrics.scoped(model, *window, picked)
 
 # ---- Page Routing ----
-if page == "Introduction":
-    st.title("Welcome!")
-    st.text("To compute the graphs in each section, specific Excel sheets and columns are necessary. If you are missing any columns or include any extra, those are registered below.")
-    missing_apps, extra_apps = methods.validate_columns(apps, constants.APPS_COLUMNS)
-    missing_int, extra_int = methods.validate_columns(interview, constants.INTERVIEW_COLUMNS)
-    missing_roe, extra_roe = methods.validate_columns(calc, constants.ROE_COLUMNS)
-    missing, extra = st.columns(2, border=True, gap="medium")
-    with missing:
-        st.subheader("Missing columns from the current Excel document:")
-        st.text("Missing columns from the Tracker sheet: " + missing_apps)
-        st.text("Missing columns from the Interviews sheet: " + missing_int)
-        st.text("Missing columns from the ROE Calculation sheet: " + missing_roe)
-    with extra:
-        st.subheader("Extra columns from the current Excel document:")
-        st.text("Extra columns from the Tracker sheet: " + extra_apps)
-        st.text("Extra columns from the Interviews sheet: " + extra_int)
-        st.text("Extra columns from the ROE Calculation sheet: " + extra_roe)
-    intro.show()
-
-elif page == "Application Data":
-    breakdown.show(apps, grahams)
-
-elif page == "Interviews":
-    interviews.show(apps, interview, grahams)
-
-elif page == "ROE":
-    roe.show(apps, calc)
-
-elif page == "Glossary":
-    glossary.show(grahams)
+with profiling.stage("render", page):
+    if page == "Introduction":
+        st.title("Welcome!")
+        st.text("To compute the graphs in each section, specific Excel sheets and columns are necessary. If you are missing any columns or include any extra, those are registered below.")
+        missing_apps, extra_apps = model.validation["Tracker"]
+        missing_int, extra_int = model.validation["Interviews"]
+        missing_roe, extra_roe = model.validation["ROE Calculation"]
+        missing, extra = st.columns(2, border=True, gap="medium")
+        with missing:
+            st.subheader("Missing columns from the current Excel document:")
+            st.text("Missing columns from the Tracker sheet: " + missing_apps)
+            st.text("Missing columns from the Interviews sheet: " + missing_int)
+            st.text("Missing columns from the ROE Calculation sheet: " + missing_roe)
+        with extra:
+            st.subheader("Extra columns from the current Excel document:")
+            st.text("Extra columns from the Tracker sheet: " + extra_apps)
+            st.text("Extra columns from the Interviews sheet: " + extra_int)
+            st.text("Extra columns from the ROE Calculation sheet: " + extra_roe)
+        page_module(page).show()
+
+    elif page != "Glossary" and not len(model.apps):
+        # The data pages need at least one application to show
+        st.warning("⚠️ No applications match the selected filters. Widen the date range or clear some filters.")
+
+    elif page == "Application Data":
+        page_module(page).show(model, grahams)
+
+    elif page == "Interviews":
+        page_module(page).show(model, grahams)
+
+    elif page == "ROE":
+        page_module(page).show(model, scoring.read_weights(weights))
+
+    elif page == "Glossary":
+        page_module(page).show(grahams)
 
+profiling.panel(profiling.finish())
@@ -0,0 +1,357 @@
+"""
+Aggregate
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import sections.incremental as incremental
+import sections.profiling as profiling
+import sections.status as status
+
+# ---------------------------------------- FUNCTIONS
+
+# Sums the weights of each group, ignoring rows outside every group (code -1)
+def group_sum(codes, n_groups, weights=None):
+    valid = codes >= 0
+    if weights is not None:
+        weights = weights[valid]
+    return np.bincount(codes[valid], weights=weights, minlength=n_groups)
+
+# Mean of the non-null values of each group, nan for groups with none
+def group_mean(codes, n_groups, values, notnull):
+    sums = group_sum(codes, n_groups, np.where(notnull, values, 0.0))
+    counts = group_sum(codes, n_groups, notnull.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+def numeric(sheet, col):
+    values = pd.to_numeric(sheet[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return values, ~np.isnan(values)
+
+def factorize_columns(sheet, cols):
+    """
+    Group codes for one or more columns, numbered in sorted key order like groupby.
+
+    Returns:
+        The code of every row (-1 where any key is missing) and a dict of column -> key of each group
+    """
+    if len(cols) == 1:
+        codes, uniques = pd.factorize(sheet[cols[0]], sort=True)
+        return codes, {cols[0]: uniques}
+    # Mixed-radix combination of the per-column codes, then renumbered to the groups that occur
+    parts = [pd.factorize(sheet[col], sort=True) for col in cols]
+    combined = np.zeros(len(sheet), dtype=np.int64)
+    missing = np.zeros(len(sheet), dtype=bool)
+    for codes, uniques in parts:
+        combined = combined * len(uniques) + codes
+        missing |= codes < 0
+    keys, inverse = np.unique(combined[~missing], return_inverse=True)
+    codes = np.full(len(sheet), -1, dtype=np.int64)
+    codes[~missing] = inverse
+    columns = {}
+    for col, (_, uniques) in reversed(list(zip(cols, parts))):
+        columns[col] = uniques.take(keys % len(uniques))
+        keys = keys // len(uniques)
+    return codes, {col: columns[col] for col in cols}
+
+# Columns of a grouping partial that add up over rows. A change to a sheet is applied by adding
+# the partial of the new rows and subtracting the partial of the rows they replace
+ADDITIVE = [
+    "Rows", "Applications", "Interviews", "Salary_Min_Sum", "Salary_Min_Count", "Salary_Max_Sum",
+    "Salary_Max_Count", "All_Positive", "Real_Positive", "Response_Time_Sum", "Response_Time_Count",
+]
+
+def group_index(keys):
+    """
+    Index of plain key values (categoricals are unwrapped so partials of different sheets align).
+    """
+    arrays = [np.asarray(values) for values in keys.values()]
+    if len(arrays) == 1:
+        return pd.Index(arrays[0], name=next(iter(keys)))
+    return pd.MultiIndex.from_arrays(arrays, names=list(keys))
+
+def grouping_partials(sheet, dims):
+    """
+    Mergeable partial aggregates of grouping_sets: per dimension, the sums and counts the table
+    is computed from, indexed by the group keys (in sorted order). The per-row inputs (status
+    masks, company codes, numeric columns) are prepared once and every dimension is factorized
+    once, then each aggregate is a single bincount.
+
+    Args:
+        sheet: The Tracker sheet, or some of its rows
+        dims: The columns to group on. A tuple of columns groups on all of them together
+    Returns:
+        A dict of dim -> DataFrame with the ADDITIVE columns and Companies
+    """
+    # Shared inputs - one pass over each column no matter how many dimensions there are
+    statuses = status.index(sheet)
+    status_notnull = (statuses.codes >= 0).astype(np.float64)
+    all_positive = statuses.mask("All").astype(np.float64)
+    real_positive = statuses.mask("Real").astype(np.float64)
+    company_codes, companies = pd.factorize(sheet["Company"])
+    interviews, interviews_notnull = numeric(sheet, "Number of Interviews")
+    salary_min, salary_min_notnull = numeric(sheet, "Salary Min")
+    salary_max, salary_max_notnull = numeric(sheet, "Salary Max")
+    response_time, response_notnull = numeric(sheet, "Response Time (Days)")
+
+    partials = {}
+    for dim in dims:
+        codes, keys = factorize_columns(sheet, [dim] if isinstance(dim, str) else list(dim))
+        n_groups = len(next(iter(keys.values())))
+
+        # Distinct companies: count the unique (group, company) pairs of each group
+        pairs = (codes >= 0) & (company_codes >= 0)
+        pair_keys = np.unique(codes[pairs].astype(np.int64) * len(companies) + company_codes[pairs])
+        n_companies = np.bincount(pair_keys // max(len(companies), 1), minlength=n_groups)
+
+        partials[dim] = pd.DataFrame({
+            "Rows": group_sum(codes, n_groups),
+            "Applications": group_sum(codes, n_groups, status_notnull),
+            "Companies": n_companies.astype(np.float64),
+            "Interviews": group_sum(codes, n_groups, np.where(interviews_notnull, interviews, 0.0)),
+            "Salary_Min_Sum": group_sum(codes, n_groups, np.where(salary_min_notnull, salary_min, 0.0)),
+            "Salary_Min_Count": group_sum(codes, n_groups, salary_min_notnull.astype(np.float64)),
+            "Salary_Max_Sum": group_sum(codes, n_groups, np.where(salary_max_notnull, salary_max, 0.0)),
+            "Salary_Max_Count": group_sum(codes, n_groups, salary_max_notnull.astype(np.float64)),
+            "All_Positive": group_sum(codes, n_groups, all_positive),
+            "Real_Positive": group_sum(codes, n_groups, real_positive),
+            "Response_Time_Sum": group_sum(codes, n_groups, np.where(response_notnull, response_time, 0.0)),
+            "Response_Time_Count": group_sum(codes, n_groups, response_notnull.astype(np.float64)),
+        }, index=group_index(keys))
+    return partials
+
+def merge_partial(partial, removed, added):
+    """
+    Applies a change to the partial aggregates of one dimension. Companies is not additive,
+    so it has to be corrected afterwards (see update_grouping).
+    """
+    with warnings.catch_warnings():
+        # Keys with missing values (cubes) can't be ordered while aligning, they're sorted below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        merged = partial.add(added, fill_value=0).sub(removed, fill_value=0)
+    merged = merged[merged["Rows"] > 0]
+    try:
+        return merged.sort_index()
+    except TypeError: # Keys mixing text and numbers can't be sorted
+        return merged
+
+def company_changes(touched_rows, cols, removed_rows, added_rows):
+    """
+    Change of the distinct company count of each group, caused by replacing removed_rows with added_rows.
+    Only the rows of the companies that changed are counted.
+
+    Args:
+        touched_rows: The rows of the sheet (after the change) of every company in removed_rows or added_rows
+        cols: The columns of the dimension
+        removed_rows, added_rows: The replaced and the new rows
+    Returns:
+        A Series of group key -> change in the number of companies
+    """
+    keys = list(cols) + ["Company"]
+    # Plain values - aligning categoricals with many categories is slower than the counting itself
+    def pair_counts(df):
+        return pd.DataFrame({col: np.asarray(df[col], dtype=object) for col in keys}).groupby(keys).size()
+
+    after = pair_counts(touched_rows)
+    before = after.sub(pair_counts(added_rows), fill_value=0).add(pair_counts(removed_rows), fill_value=0)
+    after = after.reindex(before.index, fill_value=0)
+    change = (after > 0).astype(np.int64) - (before > 0).astype(np.int64)
+    change.index = change.index.droplevel("Company")
+    change = change.groupby(level=list(range(len(cols)))).sum()
+    if len(cols) == 1:
+        change.index = pd.Index(np.asarray(change.index), name=cols[0])
+    return change
+
+def update_grouping(partials, sheet, removed_rows, added_rows):
+    """
+    The grouping partials of a sheet, from the partials of its previous version and the rows that changed.
+    """
+    dims = list(partials)
+    removed, added = grouping_partials(removed_rows, dims), grouping_partials(added_rows, dims)
+    companies = pd.unique(np.concatenate([np.asarray(removed_rows["Company"], dtype=object), np.asarray(added_rows["Company"], dtype=object)]))
+    touched_rows = sheet[sheet["Company"].isin(companies)]
+    updated = {}
+    for dim in dims:
+        # Companies is a distinct count, it can't be added up like the other columns
+        merged = merge_partial(partials[dim], removed[dim][ADDITIVE], added[dim][ADDITIVE])
+        cols = [dim] if isinstance(dim, str) else list(dim)
+        change = company_changes(touched_rows, cols, removed_rows, added_rows)
+        merged["Companies"] = merged["Companies"].add(change.reindex(merged.index, fill_value=0), fill_value=0)
+        updated[dim] = merged
+    return updated
+
+def finish_grouping(partial, interviews_int):
+    """
+    The groupby_percents table of one dimension, from its partial aggregates.
+    """
+    index = partial.index
+    keys = {name: index.get_level_values(i) for i, name in enumerate(index.names)}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raw = pd.DataFrame({
+            **keys,
+            "Applications": partial["Applications"].to_numpy().astype(np.int64),
+            "Companies": partial["Companies"].to_numpy().astype(np.int64),
+            "Interviews": partial["Interviews"].to_numpy().astype(np.int64) if interviews_int else partial["Interviews"].to_numpy(),
+            "Salary_Min": (partial["Salary_Min_Sum"] / partial["Salary_Min_Count"]).to_numpy(),
+            "Salary_Max": (partial["Salary_Max_Sum"] / partial["Salary_Max_Count"]).to_numpy(),
+            "All_Positive": partial["All_Positive"].to_numpy().astype(np.int64),
+            "Real_Positive": partial["Real_Positive"].to_numpy().astype(np.int64),
+            "Response_Time": (partial["Response_Time_Sum"] / partial["Response_Time_Count"]).to_numpy(),
+        }).sort_values("Applications", ascending=False)
+    return format_percents(raw)
+
+@profiling.timed("aggregate")
+def grouping_sets(sheet, dims):
+    """
+    Computes the groupby_percents table for several columns at once, like SQL GROUPING SETS.
+
+    Args:
+        sheet: The Tracker sheet, expects a dataframe
+        dims: The columns to group on. A tuple of columns groups on all of them together
+    Returns:
+        A dict of dim -> the same dataframe groupby_percents returns
+    """
+    interviews_int = pd.api.types.is_integer_dtype(sheet["Number of Interviews"])
+    return {dim: finish_grouping(partial, interviews_int) for dim, partial in grouping_partials(sheet, dims).items()}
+
+@profiling.timed("aggregate")
+def tables(sheet, dims):
+    """
+    grouping_sets of a loaded sheet. When the sheet is a re-upload of a cached tracker, the
+    partials are updated from the previous version instead of being computed from every row.
+    """
+    dims = tuple(dims)
+    partials = incremental.cached(
+        sheet, ("grouping", dims),
+        lambda: grouping_partials(sheet, dims),
+        lambda old, change: update_grouping(old, sheet, change.removed_rows, change.added_rows),
+    )
+    interviews_int = pd.api.types.is_integer_dtype(sheet["Number of Interviews"])
+    return {dim: finish_grouping(partial, interviews_int) for dim, partial in partials.items()}
+
+# ---------------------------------------- ROLLUPS
+
+def rollup(df, by, aggs, dropna=True):
+    """
+    Mergeable partial of df.groupby(by).agg(aggs), for count, sum and mean: per group, the row
+    count and the sum and non-null count of every column. With dropna=False rows with missing
+    keys are kept as groups of their own.
+    """
+    grouped = df.groupby(by, observed=True, dropna=dropna)
+    columns = {"Rows": grouped.size()}
+    for col, agg in aggs.items():
+        columns[col + ":count"] = grouped[col].count()
+        if agg != "count":
+            columns[col + ":sum"] = grouped[col].sum()
+    return pd.DataFrame(columns)
+
+def update_rollup(partial, removed_rows, added_rows, by, aggs, dropna=True):
+    return merge_partial(partial, rollup(removed_rows, by, aggs, dropna), rollup(added_rows, by, aggs, dropna))
+
+def finish_rollup(partial, aggs):
+    """
+    The df.groupby(by).agg(aggs) result, from its partial.
+    """
+    columns = {}
+    for col, agg in aggs.items():
+        if agg == "count":
+            columns[col] = partial[col + ":count"].astype(np.int64)
+        elif agg == "sum":
+            columns[col] = partial[col + ":sum"]
+        else:
+            columns[col] = partial[col + ":sum"] / partial[col + ":count"]
+    return pd.DataFrame(columns, index=partial.index)
+
+@profiling.timed("aggregate")
+def rolled_up(sheet, by, aggs):
+    """
+    sheet.groupby(by, observed=True).agg(aggs) for count, sum and mean aggregations, updated
+    from the previous version of the sheet after a re-upload.
+    """
+    key = (tuple(by) if isinstance(by, list) else by, tuple(aggs.items()))
+    partial = incremental.cached(
+        sheet, ("rollup",) + key,
+        lambda: rollup(sheet, by, aggs),
+        lambda old, change: update_rollup(old, change.removed_rows, change.added_rows, by, aggs),
+    )
+    return finish_rollup(partial, aggs)
+
+# ---------------------------------------- CUBES
+
+@profiling.timed("aggregate")
+def cube(sheet, dims, aggs):
+    """
+    The rollup partial of a sheet at its finest grain: one cell per combination of dims that
+    occurs (missing keys included), with the row count and the sum and non-null count of every
+    measure. Coarser groupings are summed from the cells (see roll_up) instead of the rows.
+    Cached with the loaded sheet, and updated after a re-upload like rolled_up.
+
+    Args:
+        sheet: A loaded sheet
+        dims: Every column a view can group or drill down on
+        aggs: Dict of column -> count, sum or mean, every measure the views need
+    """
+    dims = list(dims)
+    return incremental.cached(
+        sheet, ("cube", tuple(dims), tuple(aggs.items())),
+        lambda: rollup(sheet, dims, aggs, dropna=False),
+        lambda old, change: update_rollup(old, change.removed_rows, change.added_rows, dims, aggs, dropna=False),
+    )
+
+def roll_up(partial, by, where=None):
+    """
+    Sums a cube's cells up to the dims in by. Groups with a missing key are dropped, like groupby.
+
+    Args:
+        partial: A cube
+        by: A dim, or a list of dims
+        where: Optional dict of dim -> values, only cells with those keys are summed (drill-down)
+    """
+    if where:
+        keep = np.ones(len(partial), dtype=bool)
+        for dim, values in where.items():
+            keep &= partial.index.get_level_values(dim).isin(values)
+        partial = partial[keep]
+    return partial.groupby(level=by, observed=True).sum()
+
+def from_cube(partial, by, aggs, where=None):
+    """
+    sheet.groupby(by, observed=True).agg(aggs) of the sheet a cube was built from, for count, sum
+    and mean aggregations of its measures, summed from the cube.
+    """
+    return finish_rollup(roll_up(partial, by, where), aggs)
+
+def format_percents(return_df):
+    """
+    Turns raw grouped counts/means into the display table shared by every page.
+
+    Args:
+        return_df: One row per group with Applications, Companies, Interviews, Salary_Min,
+            Salary_Max, All_Positive, Real_Positive and Response_Time columns
+    """
+    return_df = return_df.copy()
+    # Calculate response % columns
+    return_df['Total Responses'] = return_df['All_Positive'] / return_df['Applications'] * 100
+    return_df['Total Responses'] = return_df['Total Responses'].apply('{:.1f}%'.format)
+    return_df['Real Responses'] = return_df['Real_Positive'] / return_df['Applications'] * 100
+    return_df['Real Responses'] = return_df['Real Responses'].apply('{:.1f}%'.format)
+
+    # Calculate salary and response columns
+    return_df['Salary_Min'] = return_df['Salary_Min'].apply('${:.2f}'.format)
+    return_df['Salary_Max'] = return_df['Salary_Max'].apply('${:.2f}'.format)
+    return_df['Response_Time'] = return_df['Response_Time'].apply('{:.2f}'.format)
+
+    # Drop calculation columns
+    return_df = return_df.drop(['All_Positive', 'Real_Positive'], axis=1)
+    # Rename columns to more intuitive things
+    return_df = return_df.rename(columns={
+        'Applications': '# of Applications',
+        'Companies': '# of Companies',
+        'Salary_Min': 'Avg Min K',
+        'Salary_Max': 'Avg Max K',
+        'Response_Time': 'Avg DTR'
+    })
+
+    return return_df
@@ -1,62 +1,61 @@
 import streamlit as st
 from  streamlit_vertical_slider import vertical_slider 
 import altair as alt
+import pandas as pd
 
 # Homebrew files
+import sections.charts as charts
 import sections.constants as constants
-from sections.methods import *
+import sections.profiling as profiling
+from sections.methods import bar_text
+from sections.metrics import BREAKDOWN_DIMS
 
 # Color constants
 color1 = constants.COLOR1
 color2 = constants.COLOR2
 
-def show(apps, grahams):
+def show(model, grahams):
     st.title("Application Data")
     try:
         # ----------------------------------------------- Constants
-        # Number of apps
-        total_apps = apps[apps.columns[0]].dropna().count()
-
-        # Apps DF where Pending is dropped
-        apps_nopend = apps[apps["Status"].str.contains("Pending")==False]
-
-        unique_companies = len(pd.unique(apps['Company']))
+        total_apps = model.total_apps
+        unique_companies = model.unique_companies
 
         # Response rate calcs
-        response_number = sum(1 for app_stat in apps_nopend["Status"].dropna() if app_stat in constants.ALL_RESP)
-        real_response_number = sum(1 for app_stat in apps_nopend["Status"].dropna() if app_stat in constants.REAL_RESP)
+        response_number = model.response_number
+        real_response_number = model.real_response_number
 
         # Response time (only historical, not considering Pending)
-        response_average = apps['Response Time (Days)'].dropna().mean()
-        real_response_average = apps[apps['Status'].isin(constants.REAL_RESP)]['Response Time (Days)'].dropna().mean()
-        longest_response = apps['Response Time (Days)'].dropna().max()
-        longest_response_company = apps.iloc[int(apps['Response Time (Days)'].dropna().idxmax()), 0]
-        num_weeks = apps["Week"].max() # Number of weeks for later calc
+        response_average = model.response_average
+        real_response_average = model.real_response_average
+        longest_response = model.longest_response
+        longest_response_company = model.longest_response_company
+        num_weeks = model.num_weeks # Number of weeks for later calc
 
         # Interview metrics
-        currently_interviewing = sum(1 for app_stat in apps["Status"].dropna() if app_stat in ["Interviewing"])
+        currently_interviewing = model.currently_interviewing
 
         # ----------------------------------------------- Dataframes
-        industry_df = groupby_percents(apps, "Industry")
-        role_df = groupby_percents(apps, "Role Type")
-        comp_size_df = groupby_percents(apps, "Company Size")
+        # Every grouping on the page comes from the one-pass tables in the metrics model
+        tables = model.tables
+        industry_df = tables["Industry"]
+        role_df = tables["Role Type"]
+        comp_size_df = tables["Company Size"]
         comp_size_df = comp_size_df.drop(["Avg Min K", "Avg Max K"], axis=1)
-        platform_df = groupby_percents(apps, "Platform")
+        platform_df = tables["Platform"]
 
-        weekly_df = groupby_percents(apps, "Week")
-        if weekly_df.iloc[len(weekly_df)-1][0] < 0: # Drop extra auto values if they exist
-            weekly_df = weekly_df.drop(0) 
-        last_four_weeks = weekly_df['# of Applications'].head(4).sum()
+        weekly_df = model.weekly
+        last_four_weeks = model.last_four_weeks
 
-        resume_df = groupby_percents(apps, "Resume ID")
+        resume_df = tables["Resume ID"]
         resume_df = resume_df.sort_values("# of Applications", ascending=False)
         resume_df = resume_df.drop(["Avg Min K", "Avg Max K"], axis=1)
 
-        cover_df = groupby_percents(apps, "Cover Letter")
+        cover_df = tables["Cover Letter"]
         cover_df = cover_df.sort_values("# of Applications", ascending=False)
         cover_df = cover_df.drop(["Avg Min K", "Avg Max K"], axis=1)
 
-        month_df = groupby_percents(apps, "Month").sort_values("Month")
+        month_df = tables["Month"].sort_values("Month")
         month_df = month_df.drop(["Avg Min K", "Avg Max K"], axis=1)
 
         # ----------------------------------------------- Calculations
@@ -82,7 +81,7 @@ def show(apps, grahams):
                 y=alt.Y("# of Applications:Q", title="# Applications Sent"),
                 color=alt.value(color1)
             )
-            st.altair_chart(platform, use_container_width=True)
+            profiling.altair_chart(platform, use_container_width=True)
             if grahams:
                 st.text("In the master data, the industry 'Recruiter' represents listings posted by a recruiting agency on behalf of another company. The overwhelming majority of postings like these are from financial/investment banking firms. The response rate for these kinds of listings is abysmal.")
         with col4:
@@ -92,7 +91,7 @@ def show(apps, grahams):
                 y=alt.Y("# of Applications:Q", title="# Applied To"),
                 color=alt.value(color2)
             )
-            st.altair_chart(platform, use_container_width=True)
+            profiling.altair_chart(platform, use_container_width=True)
 
         st.html("<hr>")
         # Company data
@@ -130,116 +129,160 @@ def show(apps, grahams):
         # Histogram of response time
         st.subheader("Application Response Time:")
         st.text("How long does it take a company to respond to my application?")
-        hist_apps_clean = apps.dropna(subset=['Response Time (Days)'])
-        # Optional filtering
-        min_day = int(hist_apps_clean['Response Time (Days)'].min())
-        max_day = int(hist_apps_clean['Response Time (Days)'].max())
-
-        hist1, hist2 = st.columns([7,1])
-        # Scale to measure application
-        with hist2:
-            bin_size = vertical_slider(
-                label = "X Scaling:",  #Optional
-                key = "vert_01" ,
-                # height = 300, #Optional - Defaults to 300
-                thumb_shape = "square", #Optional - Defaults to "circle"
-                step = 1, #Optional - Defaults to 1
-                default_value=3 ,#Optional - Defaults to 0
-                min_value= 1, # Defaults to 0
-                max_value= 10, # Defaults to 10
-                track_color = color2, #Optional - Defaults to Streamlit Red
-                slider_color = color1, #Optional
-                thumb_color= color1, #Optional - Defaults to Streamlit Red
-                value_always_visible = True , #Optional - Defaults to False
-            )
-        with hist1:
-            # Histogram chart
-            hist = alt.Chart(hist_apps_clean).mark_bar().encode(
-                alt.X("Response Time (Days):Q", bin=alt.Bin(step=bin_size), title="Response Time (Days)"),
-                y=alt.Y("count():Q", title="Number of Applications"),
-                tooltip=['count()'],
+        response_histogram(model)
+
+        # ----------------------------------------------- More Calculations
+        st.write("#")
+        st.html("<hr style='border: 5px solid black; border-radius: 5px'>")
+        st.header("Application Data")
+        st.text("Details about the actual applications themselves, like cover letter metrics, resume differences, etc.")
+
+        next1, next2 = st.columns(2, border=True, gap="medium")
+        with next1:
+            st.subheader("Applications per WEEK:")
+            # Create the chart
+            weekly = alt.Chart(weekly_df).mark_bar().encode(
+                x=alt.X("Week:O", title="Week Number"),
+                y=alt.Y("# of Applications:Q", title="Applications"),
                 color=alt.value(color1)
-            ).interactive()
-            # Text layer with aggregate count
-            hist_text = hist.mark_text(
-                align='center',
-                baseline='bottom',
-                dy=-2
-            ).encode(
-                text='count():Q'
             )
-            st.altair_chart(hist)
-
-            # ----------------------------------------------- More Calculations
-            st.write("#")
-            st.html("<hr style='border: 5px solid black; border-radius: 5px'>")
-            st.header("Application Data")
-            st.text("Details about the actual applications themselves, like cover letter metrics, resume differences, etc.")
-
-            next1, next2 = st.columns(2, border=True, gap="medium")
-            with next1:
-                st.subheader("Applications per WEEK:")
-                # Create the chart
-                weekly = alt.Chart(weekly_df).mark_bar().encode(
-                    x=alt.X("Week:O", title="Week Number"),
-                    y=alt.Y("# of Applications:Q", title="Applications"),
-                    color=alt.value(color1)
-                )
-                # Text labels showing response_rate
-                weekly =  weekly + bar_text(weekly, -16, "Total Responses") + bar_text(weekly, -4, "Real Responses")
-                # Chart
-                st.altair_chart(weekly, use_container_width=True)
-                st.text("Average applications per week: " + '{0:.3g}'.format(total_apps/num_weeks))
-            with next2:
-                st.subheader("Applications by PLATFORM:")
-                # Create the chart
-                platform = alt.Chart(platform_df).mark_bar().encode(
-                    x=alt.X("Platform:O", title="Platform", sort=None),
-                    y=alt.Y("# of Applications:Q", title="# Applications Sent"),
-                    color=alt.value(color2)
-                )
-                # Text labels showing response_rate
-                platform =  platform + bar_text(platform, -16, "Total Responses") + bar_text(platform, -4, "Real Responses")
-                # Chart
-                st.altair_chart(platform, use_container_width=True)
-            st.text("Key: 'T' is Total Response rate, 'R' is Real Response rate.")
-            st.text("Ex: In Week 1, the total response rate was T and the real response rate was R.")
+            # Text labels showing response_rate
+            weekly =  weekly + bar_text(weekly, -16, "Total Responses") + bar_text(weekly, -4, "Real Responses")
+            # Chart
+            profiling.altair_chart(weekly, use_container_width=True)
+            st.text("Average applications per week: " + '{0:.3g}'.format(total_apps/num_weeks))
+        with next2:
+            st.subheader("Applications by PLATFORM:")
+            # Create the chart
+            platform = alt.Chart(platform_df).mark_bar().encode(
+                x=alt.X("Platform:O", title="Platform", sort=None),
+                y=alt.Y("# of Applications:Q", title="# Applications Sent"),
+                color=alt.value(color2)
+            )
+            # Text labels showing response_rate
+            platform =  platform + bar_text(platform, -16, "Total Responses") + bar_text(platform, -4, "Real Responses")
+            # Chart
+            profiling.altair_chart(platform, use_container_width=True)
+        st.text("Key: 'T' is Total Response rate, 'R' is Real Response rate.")
+        st.text("Ex: In Week 1, the total response rate was T and the real response rate was R.")
 
+        st.html("<hr>")
+        st.subheader("Month by Month")
+        mon1, mon2 = st.columns([2,1], gap='medium')
+        with mon1:
+            try:
+                month_df = month_df[month_df["# of Applications"] != 0]
+                st.dataframe(month_df, hide_index=True)
+            except:
+                st.text("Error dropping null value months.")
+            st.text("Note: 'DTR' stands for 'Days to Respond'.")
+        with mon2:
+            st.text("How has my process changed over time?")
+            st.text("Usually there's a 2-3 week lag in responses from companies, so data becomes more accurate as revisions come in.")
+        response_trend(model)
+
+        # Cover Letter info
+        st.html("<hr>")
+        st.subheader("Resume Details")
+        st.text("How successful are tailored resumes?")
+        res1, res2 = st.columns([2,1], gap="medium")
+        with res1:
+            st.dataframe(resume_df, hide_index=True)
+        with res2:
+            st.text("This section measures the effectiveness of tailoring resumes.")
+
+        # Cover Letter info
+        st.html("<hr>")
+        st.subheader("Cover Letter Details")
+        st.text("How successful are cover letters?")
+        cov1, cov2 = st.columns([2,1], gap="medium")
+        with cov1:
+            st.dataframe(cover_df, hide_index=True)
+        with cov2:
+            st.text("This section measures the effectiveness of cover letters.")
+            st.text("Definitions for each of the cover letter types in the master data is provided in the Glossary.")
+
+        # Cohort info
+        if model.sources:
             st.html("<hr>")
-            st.subheader("Month by Month")
-            mon1, mon2 = st.columns([2,1], gap='medium')
-            with mon1:
-                try:
-                    month_df = month_df[month_df["# of Applications"] != 0]
-                    st.dataframe(month_df, hide_index=True)
-                except:
-                    st.text("Error dropping null value months.")
-                st.text("Note: 'DTR' stands for 'Days to Respond'.")
-            with mon2:
-                st.text("How has my process changed over time?")
-                st.text("Usually there's a 2-3 week lag in responses from companies, so data becomes more accurate as revisions come in.")
-
-            # Cover Letter info
-            st.html("<hr>")
-            st.subheader("Resume Details")
-            st.text("How successful are tailored resumes?")
-            res1, res2 = st.columns([2,1], gap="medium")
-            with res1:
-                st.dataframe(resume_df, hide_index=True)
-            with res2:
-                st.text("This section measures the effectiveness of tailoring resumes.")
-
-            # Cover Letter info
-            st.html("<hr>")
-            st.subheader("Cover Letter Details")
-            st.text("How successful are cover letters?")
-            cov1, cov2 = st.columns([2,1], gap="medium")
-            with cov1:
-                st.dataframe(cover_df, hide_index=True)
-            with cov2:
-                st.text("This section measures the effectiveness of cover letters.")
-                st.text("Definitions for each of the cover letter types in the master data is provided in the Glossary.")
+            st.subheader("By Tracker")
+            st.text("Every uploaded tracker side by side.")
+            st.dataframe(model.cohort_tables[constants.SOURCE], hide_index=True)
+            cohort_breakdown(model)
 
 
     except:
-        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
\ No newline at end of file
+        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
+
+# Rolling response rates from the time series - changing the window only reruns the trend
+@st.fragment
+def response_trend(model):
+    st.subheader("Response Rate Trend")
+    trend1, trend2 = st.columns([7,1])
+    with trend2:
+        weeks = st.number_input("Weeks:", min_value=1, max_value=26, value=8, step=1)
+    with trend1:
+        trend = pd.concat([model.trend(4), model.trend(weeks)]) if weeks != 4 else model.trend(4)
+        trend = trend.assign(window=trend["weeks"].astype(str) + " weeks")
+        lines = alt.Chart(charts.project(trend, ["date", "window", "response_rate", "real_response_rate", "applications"])).mark_line(point=True).encode(
+            x=alt.X("date:T", title="Week Ending"),
+            y=alt.Y("real_response_rate:Q", title="Real Response Rate (%)"),
+            color=alt.Color("window:N", title="Rolling Window", scale=alt.Scale(range=[color1, color2])),
+            tooltip=[
+                alt.Tooltip("date:T", title="Week Ending"),
+                alt.Tooltip("window:N", title="Window"),
+                alt.Tooltip("applications:Q", title="Applications"),
+                alt.Tooltip("response_rate:Q", title="Response Rate (%)", format=".1f"),
+                alt.Tooltip("real_response_rate:Q", title="Real Response Rate (%)", format=".1f"),
+            ]
+        )
+        profiling.altair_chart(lines, use_container_width=True)
+    st.text("Real response rate of the applications sent in the 4 (and N) weeks before each week's end.")
+
+# Reruns on its own when the slider moves, so only the histogram is rebuilt
+@st.fragment
+def response_histogram(model):
+    hist1, hist2 = st.columns([7,1])
+    # Scale to measure application
+    with hist2:
+        bin_size = vertical_slider(
+            label = "X Scaling:",  #Optional
+            key = "vert_01" ,
+            # height = 300, #Optional - Defaults to 300
+            thumb_shape = "square", #Optional - Defaults to "circle"
+            step = 1, #Optional - Defaults to 1
+            default_value=3 ,#Optional - Defaults to 0
+            min_value= 1, # Defaults to 0
+            max_value= 10, # Defaults to 10
+            track_color = color2, #Optional - Defaults to Streamlit Red
+            slider_color = color1, #Optional
+            thumb_color= color1, #Optional - Defaults to Streamlit Red
+            value_always_visible = True , #Optional - Defaults to False
+        )
+    with hist1:
+        # Histogram chart, summed from the per-day counts so only the bar counts are sent to the browser
+        bins = model.response_distribution.histogram(bin_size, "Response Time (Days)")
+        hist = alt.Chart(bins).mark_bar().encode(
+            alt.X("Response Time (Days):Q", bin=alt.Bin(binned=True, step=bin_size), title="Response Time (Days)"),
+            x2="Response Time (Days)_end:Q",
+            y=alt.Y("count:Q", title="Number of Applications"),
+            tooltip=[alt.Tooltip("count:Q", title="Count of Records")],
+            color=alt.value(color1)
+        ).interactive()
+        # Text layer with aggregate count
+        hist_text = hist.mark_text(
+            align='center',
+            baseline='bottom',
+            dy=-2
+        ).encode(
+            text='count:Q'
+        )
+        profiling.altair_chart(hist)
+        percentiles = model.response_percentiles
+        st.text("Median time to respond: {0:.3g} days. 75% of responses came within {1:.3g} days, 90% within {2:.3g} days.".format(percentiles[50], percentiles[75], percentiles[90]))
+
+# Reruns on its own when the column changes - the tables are precomputed in the metrics model
+@st.fragment
+def cohort_breakdown(model):
+    dim = st.selectbox("Compare trackers by:", options=BREAKDOWN_DIMS)
+    st.dataframe(model.cohort_tables[(constants.SOURCE, dim)], hide_index=True)
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Charts
+
+Reduces chart data to what the chart actually draws before it is handed to Altair. Every row
+and column passed to alt.Chart is serialized to JSON and sent to the browser on each rerun, so
+charts only get the fields they encode, and binning/aggregation is done here with NumPy
+instead of by Vega-Lite in the browser.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.loader as loader
+
+# Floats are sent with this many decimals, the rest is just JSON size
+DECIMALS = 6
+# Widest range of whole numbers a Distribution keeps a count per unit for
+MAX_UNITS = 1_000_000
+
+class Distribution:
+    """
+    The values of a numeric column sorted once, for histograms at any bin step and for order
+    statistics. When the values are whole numbers (ex: days) a count per unit is kept as well,
+    and the histogram of any whole step is summed from it instead of binning the values again.
+    """
+    def __init__(self, values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype=float)
+        self.sorted = np.sort(values)
+        self.units = None
+        if len(values) and np.array_equal(self.sorted, np.round(self.sorted)) and self.sorted[-1] - self.sorted[0] < MAX_UNITS:
+            self.first = int(self.sorted[0])
+            self.units = np.bincount((self.sorted - self.first).astype(np.int64))
+
+    def __len__(self):
+        return len(self.sorted)
+
+    @property
+    def max(self):
+        return self.sorted[-1] if len(self) else np.nan
+
+    @property
+    def min(self):
+        return self.sorted[0] if len(self) else np.nan
+
+    def percentile(self, q):
+        """
+        The q-th percentile (0-100), interpolated like np.percentile, read from the sorted values.
+        """
+        if not len(self):
+            return np.nan
+        position = q / 100 * (len(self) - 1)
+        lo = int(np.floor(position))
+        hi = min(lo + 1, len(self) - 1)
+        return self.sorted[lo] + (self.sorted[hi] - self.sorted[lo]) * (position - lo)
+
+    def histogram(self, step, name="bin"):
+        """
+        Same as histogram(values, step, name) for the column's values.
+        """
+        if self.units is None or step != int(step) or not len(self):
+            return histogram(pd.Series(self.sorted), step, name)
+        start, count = bin_edges(self.sorted, step)
+        # Bin of every unit from the first value, values on the upper edge go into the last bin
+        bins = np.clip((self.first + np.arange(len(self.units)) - start) // step, 0, count - 1).astype(np.int64)
+        counts = np.bincount(bins, weights=self.units, minlength=count).astype(np.int64)
+        filled = np.flatnonzero(counts)
+        return pd.DataFrame({
+            name: start + filled * step,
+            name + "_end": start + (filled + 1) * step,
+            "count": counts[filled],
+        })
+
+# ---------------------------------------- FUNCTIONS
+
+def project(df, fields):
+    """
+    Only the encoded columns of a frame (in the given order, duplicates dropped), with floats rounded.
+
+    Args:
+        df: The chart data
+        fields: Every field the chart encodes (x, y, color, tooltip, ...)
+    """
+    projected = df[list(dict.fromkeys(fields))]
+    floats = projected.select_dtypes("float").columns
+    if len(floats):
+        projected = projected.round({col: DECIMALS for col in floats})
+    return projected
+
+def bin_edges(values, step):
+    """
+    The start, stop and number of bins Vega-Lite would use for bin=alt.Bin(step=step):
+    the extent of the values widened to multiples of step.
+    """
+    start = np.floor(values.min() / step) * step
+    stop = np.ceil(values.max() / step) * step
+    count = max(1, int(round((stop - start) / step)))
+    return start, count
+
+def histogram(values, step, name="bin"):
+    """
+    Bins values the way Vega-Lite does and counts them. Only non-empty bins are returned.
+
+    Args:
+        values: Series of numbers, missing values are left out
+        step: Bin width
+        name: Name of the bin start column, the end column gets "_end" appended
+    Returns:
+        DataFrame with columns name, name_end and count - draw it with
+        x=alt.X(name, bin=alt.Bin(binned=True, step=step)), x2=name_end
+    """
+    values = pd.to_numeric(values, errors="coerce").dropna().to_numpy(dtype=float)
+    if len(values) == 0:
+        return pd.DataFrame({name: [], name + "_end": [], "count": []})
+    start, count = bin_edges(values, step)
+    # Vega puts values on the upper edge into the last bin
+    bins = np.clip(np.floor((values - start) / step).astype(np.int64), 0, count - 1)
+    counts = np.bincount(bins, minlength=count)
+    filled = np.flatnonzero(counts)
+    return pd.DataFrame({
+        name: start + filled * step,
+        name + "_end": start + (filled + 1) * step,
+        "count": counts[filled],
+    })
+
+# Distribution of a column, kept with the loaded workbook so every bin step of its histogram is a sum of counts
+def distribution(frame, col):
+    return loader.derived(frame, ("distribution", col), lambda: Distribution(frame[col]))
+
+def column_histogram(frame, col, step):
+    return distribution(frame, col).histogram(step, col)
+
+def summed(df, by, field):
+    """
+    Sums field per group, for stacked bar charts whose table has more detail than the chart shows.
+    Groups keep their order of first appearance.
+    """
+    return df.groupby(list(by), sort=False, dropna=False, observed=True)[field].sum().reset_index()
+
+def cell_index(values, bins):
+    """
+    Equal-width bin of each value between the min and max. Returns (bin per value, bin edges).
+    """
+    low, high = float(values.min()), float(values.max())
+    if high <= low:
+        high = low + 1
+    edges = np.linspace(low, high, bins + 1)
+    cells = np.clip(((values - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+    return cells, edges
+
+def density(df, x, y, by, bins=(60, 30)):
+    """
+    2D density of a scatterplot: points counted per cell of an equal-width grid, with the most
+    common value of `by` in each cell. Only non-empty cells are returned.
+
+    Args:
+        df: The scatterplot data
+        x, y: The plotted columns
+        by: Column the points are colored by
+        bins: Number of (x, y) cells
+    Returns:
+        DataFrame with columns x, x_end, y, y_end (named after the columns), count and by - draw it
+        with mark_rect and bin=alt.Bin(binned=True) on both axes
+    """
+    data = df[[x, y, by]].dropna(subset=[x, y])
+    if len(data) == 0:
+        return pd.DataFrame(columns=[x, x + "_end", y, y + "_end", "count", by])
+    x_cells, x_edges = cell_index(data[x].to_numpy(dtype=float), bins[0])
+    y_cells, y_edges = cell_index(data[y].to_numpy(dtype=float), bins[1])
+    cells = x_cells * bins[1] + y_cells
+    codes, labels = pd.factorize(data[by])
+    n_cells = bins[0] * bins[1]
+    counts = np.bincount(cells, minlength=n_cells)
+    # Count per (cell, label), the label with the highest count is the cell's
+    by_label = np.bincount(cells * (len(labels) + 1) + codes + 1, minlength=n_cells * (len(labels) + 1))
+    dominant = by_label.reshape(n_cells, len(labels) + 1)[:, 1:].argmax(axis=1)
+    filled = np.flatnonzero(counts)
+    x_filled, y_filled = filled // bins[1], filled % bins[1]
+    return pd.DataFrame({
+        x: x_edges[x_filled],
+        x + "_end": x_edges[x_filled + 1],
+        y: y_edges[y_filled],
+        y + "_end": y_edges[y_filled + 1],
+        "count": counts[filled],
+        by: np.asarray(labels, dtype=object)[dominant[filled]] if len(labels) else None,
+    })
+
+def outliers(df, y, n):
+    """
+    The n rows with the highest and the n rows with the lowest y, for drawing as points over a density grid.
+    """
+    values = df[y].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= 2 * n:
+        return df.iloc[valid]
+    order = valid[np.argsort(values[valid], kind="stable")]
+    return df.iloc[np.concatenate([order[:n], order[-n:]])]
@@ -41,11 +41,87 @@ ROE_COLUMNS = [
     "ROE"
 ]
 
+# Compact dtypes the sheets are converted to at load time (see sections/schema.py):
+# category for text dimensions, int for counts (the smallest int that fits, float32 when
+# values are missing), float for scores (float32), date for dates
+APPS_DTYPES = {
+    "Company": "category",
+    "Industry": "category",
+    "Role Type": "category",
+    "Date": "date",
+    "Salary Min": "int",
+    "Salary Max": "int",
+    "Platform": "category",
+    "Resume ID": "category",
+    "Cover Letter": "category",
+    "Company Size": "category",
+    "Status": "category",
+    "Response Date": "date",
+    "Response Time (Days)": "int",
+    "Number of Interviews": "int",
+    "Month": "category", # m/yy text, not a number
+    "Week": "int",
+}
+INTERVIEW_DTYPES = {
+    "Company": "category",
+    "Role Type": "category",
+    "Date": "date",
+    "Round": "int",
+    "Type of Interview": "category",
+    "Location": "category",
+    "Performance": "int",
+    "Experience": "int",
+}
+ROE_DTYPES = {
+    "Company Name": "category",
+    "Application Status": "category",
+    "Chance of Success": "float",
+    "Application Effort": "float",
+    "ROE": "float",
+}
+# Side by side tables of value -> score (see sections/scoring.py). Repeated headers are
+# numbered when loaded, like pandas does
+WEIGHTS_DTYPES = {
+    "Industry": "category",
+    "Score": "float",
+    "Platform": "category",
+    "Score.1": "float",
+    "Role": "category",
+    "Score.2": "float",
+    "Status": "category",
+    "Score.3": "float",
+}
+SHEET_DTYPES = {
+    "Tracker": APPS_DTYPES,
+    "Interviews": INTERVIEW_DTYPES,
+    "ROE Calculation": ROE_DTYPES,
+    "Weights": WEIGHTS_DTYPES,
+}
+
+# Column added to cohort datasets (several trackers analyzed together), naming the tracker of each row
+SOURCE = "Source"
+
 ALL_RESP = ['Rejected', 'Bailed', 'Interviewing', 'Ghosted', "Selected Out", 
             'On Hold', 'Denied', 'Viewed', 'Offer', 'No Offer', "Closed"] # Denied, Closed, Viewed are auto responses
 
 REAL_RESP = ['Rejected', 'Bailed', 'Interviewing', 'Ghosted', 'On Hold', 'Offer', 'No Offer', "Selected Out"] 
 # So real != Denied, Viewed Closed
 
+# Status groups the status index precomputes masks for. A group is a list of statuses,
+# or a function of the status text (Pending also covers labels like "Pending - Referral")
+STATUS_GROUPS = {
+    "All": ALL_RESP,
+    "Real": REAL_RESP,
+    "Pending": lambda status: "Pending" in status,
+    "Interviewing": ["Interviewing"],
+    "Offer": ["Offer"],
+}
+
+# Columns of the filter bar, which filters every page (see sections/filters.py)
+FILTER_COLUMNS = ["Industry", "Role Type", "Platform", "Company Size", "Status", "Resume ID", "Cover Letter"]
+
+# Scatterplots with more points than this are drawn as a density grid with the outliers on top
+SCATTER_MAX_POINTS = 5000
+
 COLOR1 = "#26bce1"
 COLOR2 = "#4a58dd"
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Dates
+
+The date dimension. Calendar fields are derived from the parsed Date columns with vectorized
+datetime arithmetic once, when a workbook is loaded, so the app no longer depends on the
+Week, Month and Response Time (Days) formulas of the Excel tracker (or their junk values).
+"""
+import pandas as pd
+
+import sections.schema as schema
+
+# ---------------------------------------- FUNCTIONS
+
+def week_number(dates):
+    """
+    Week of the year like Excel's WEEKNUM: weeks start on Sunday and the week with January 1st is week 1.
+    """
+    day_of_year = dates.dt.dayofyear
+    # Weekday of January 1st, counted from Sunday
+    jan_first = (dates.dt.dayofweek - (day_of_year - 1) + 1) % 7
+    return (day_of_year - 1 + jan_first) // 7 + 1
+
+# "m/yy", ex: 5/25
+def month_label(dates):
+    return dates.dt.month.astype("Int64").astype(str) + "/" + (dates.dt.year % 100).astype("Int64").astype(str).str.zfill(2)
+
+def response_days(applied, responded):
+    return (responded - applied).dt.days
+
+def calendar(dates):
+    """
+    Calendar fields of a date column.
+
+    Returns:
+        DataFrame with date, day (0 = Monday), week (ISO), weeknum (Excel WEEKNUM) and month (name)
+    """
+    return pd.DataFrame({
+        "date": dates,
+        "day": dates.dt.dayofweek,
+        "week": dates.dt.isocalendar().week,
+        "weeknum": week_number(dates),
+        "month": dates.dt.month_name(),
+    })
+
+def daily_counts(dates):
+    """
+    Number of rows per day with the calendar fields of the day, sorted by date. The fields
+    are computed once per distinct day.
+    """
+    counts = dates.dropna().dt.normalize().value_counts().sort_index()
+    days = calendar(pd.Series(counts.index))
+    days.insert(1, "count", counts.to_numpy())
+    return days
+
+def add_tracker_dates(apps):
+    """
+    Derives Week, Month and Response Time (Days) of the Tracker from Date and Response Date.
+    Trackers whose Date column isn't dates are returned as they are.
+    """
+    if "Date" not in apps.columns or not pd.api.types.is_datetime64_any_dtype(apps["Date"]):
+        return apps
+    dates = apps["Date"]
+    derived = {
+        "Week": schema.as_int(week_number(dates)),
+        "Month": schema.as_category(month_label(dates).where(dates.notna())),
+    }
+    if "Response Date" in apps.columns and pd.api.types.is_datetime64_any_dtype(apps["Response Date"]):
+        derived["Response Time (Days)"] = schema.as_int(response_days(dates, apps["Response Date"]))
+    return apps.assign(**derived)
+
+def add_dates(sheets):
+    """
+    Adds the date dimension to a dict of sheet name -> DataFrame (or None).
+    """
+    if sheets.get("Tracker") is None:
+        return sheets
+    return {**sheets, "Tracker": add_tracker_dates(sheets["Tracker"])}
@@ -0,0 +1,82 @@
+"""
+Filters
+
+The filter bar's index. Every value of a filter column gets a bitmap of its rows (one bit per row,
+packed with np.packbits), built once per loaded sheet from the column's codes. Applying filters
+ORs the bitmaps of the values picked in a column and ANDs the columns together, so changing a
+filter never compares strings or rescans the sheet.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+import sections.loader as loader
+import sections.profiling as profiling
+
+# Columns with more distinct values than this (ex: free text) aren't offered as filters
+MAX_VALUES = 500
+
+class FilterIndex:
+    """
+    Per-value row bitmaps of the filter columns of a sheet.
+    """
+    @profiling.timed("derive")
+    def __init__(self, sheet, columns=None):
+        self.rows = len(sheet)
+        self.values = {}
+        self.bitmaps = {}
+        for col in constants.FILTER_COLUMNS if columns is None else columns:
+            if col not in sheet.columns:
+                continue
+            codes, labels = pd.factorize(sheet[col], sort=True)
+            if len(labels) > MAX_VALUES:
+                continue
+            # Rows grouped by code once, then one bitmap per value
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.values[col] = list(labels)
+            self.bitmaps[col] = {}
+            for label, lo, hi in zip(labels, bounds[:-1], bounds[1:]):
+                member = np.zeros(self.rows, dtype=bool)
+                member[order[lo:hi]] = True
+                self.bitmaps[col][label] = np.packbits(member)
+
+    @property
+    def columns(self):
+        return list(self.values)
+
+    def bitmap(self, filters):
+        """
+        Packed bitmap of the rows matching every filter, or None when no filter applies.
+
+        Args:
+            filters: Dict of column -> picked values. Columns the sheet doesn't have, and
+                empty picks, don't filter
+        """
+        result = None
+        for col, picked in filters.items():
+            if col not in self.bitmaps or not picked:
+                continue
+            column = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            for value in picked:
+                if value in self.bitmaps[col]:
+                    column |= self.bitmaps[col][value]
+            result = column if result is None else result & column
+        return result
+
+    def mask(self, filters):
+        """
+        Boolean row mask of the rows matching every filter, or None when no filter applies.
+        """
+        bits = self.bitmap(filters)
+        return np.unpackbits(bits, count=self.rows).astype(bool) if bits is not None else None
+
+# ---------------------------------------- FUNCTIONS
+
+# The filter index of a sheet, built once per loaded workbook
+def index(sheet):
+    return loader.derived(sheet, "filters", lambda: FilterIndex(sheet))
+
+# Filters with at least one value picked, as a hashable key
+def key(filters):
+    return tuple(sorted((col, tuple(sorted(map(str, picked)))) for col, picked in filters.items() if picked))
@@ -0,0 +1,286 @@
+"""
+Funnel
+
+Links every interview to the application it belongs to, and follows the applications through the
+hiring funnel: applied -> responded -> round 1..N -> offer.
+
+Interviews are joined on the normalized company and role type (and the tracker, in a cohort).
+Both sides are encoded as integer keys once, the applications sorted by (key, date), and every
+interview finds the last application of its key sent on or before its date with one binary
+search - no string comparisons per row, no nested loops. Interviews logged before any application
+of their key take the first one after it. Interviews whose role type doesn't match an application
+of the company (ex: a first round phone call that covered several roles) are then joined on the
+company alone.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+import sections.loader as loader
+import sections.profiling as profiling
+import sections.status as status
+from sections.charts import Distribution
+from sections.timeseries import to_days
+
+# How an interview was linked to its application
+MATCH_ROLE = "Company and role"
+MATCH_COMPANY = "Company"
+MATCH_NONE = "Not linked"
+
+class Funnel:
+    """
+    Applications joined to their interviews, with the stages each application reached and the
+    days it spent in every stage.
+
+    Attributes:
+        link: Tracker row of every interview, -1 when it matches no application
+        match: How every interview was linked (MATCH_ROLE, MATCH_COMPANY or MATCH_NONE)
+        rounds: Number of interview rounds of the longest process
+        reached: Deepest stage reached by every application: 0 applied, 1 responded,
+            1 + k interview round k
+        offer: Boolean mask of the applications with an offer status. The Offer stage only counts
+            the ones that reached the stage before it (see counts)
+    """
+    @profiling.timed("derive")
+    def __init__(self, apps, interviews):
+        # Held so the id in the cache key (see funnel) can't be reused while this is cached
+        self.interviews = interviews
+        self.n_apps = len(apps)
+        applied = days(apps["Date"]) if "Date" in apps.columns else np.full(self.n_apps, np.nan)
+        interview_days = days(interviews["Date"]) if "Date" in interviews.columns else np.full(len(interviews), np.nan)
+        self.link, self.match = join(apps, interviews, applied, interview_days)
+        linked = self.link >= 0
+        linked_apps = self.link[linked]
+        self.linked_counts = np.bincount(linked_apps, minlength=self.n_apps)
+
+        # An interview without a round number is at least a first round
+        rounds = pd.to_numeric(interviews["Round"], errors="coerce").to_numpy(dtype=float) if "Round" in interviews.columns else np.ones(len(interviews))
+        rounds = np.maximum(np.nan_to_num(rounds, nan=1), 1).astype(np.int64)[linked]
+        deepest = np.zeros(self.n_apps, dtype=np.int64)
+        np.maximum.at(deepest, linked_apps, rounds)
+        self.rounds = int(deepest.max()) if self.n_apps else 0
+
+        statuses = status.index(apps) if "Status" in apps.columns else None
+        responded = deepest > 0
+        if statuses is not None:
+            responded |= statuses.mask("All")
+        if "Response Date" in apps.columns:
+            responded |= apps["Response Date"].notna().to_numpy()
+        self.reached = np.where(deepest > 0, 1 + deepest, responded.astype(np.int64))
+        self.offer = statuses.mask("Offer") if statuses is not None else np.zeros(self.n_apps, dtype=bool)
+
+        # Day each application entered each stage, NaN when it didn't or the date is missing
+        response = days(apps["Response Date"]) if "Response Date" in apps.columns else np.full(self.n_apps, np.nan)
+        self.entered = [applied, response] + first_days(linked_apps, rounds, interview_days[linked], self.n_apps, self.rounds)
+
+    @property
+    def stages(self):
+        return ["Applied", "Responded"] + [f"Round {k}" for k in range(1, self.rounds + 1)] + ["Offer"]
+
+    def counts(self, where=None):
+        """
+        Number of applications that reached each stage (see stages), optionally only counting
+        the applications where the mask `where` is True. Offers are only counted for applications
+        that got a first round (or a response, when no interview is linked at all), so every stage
+        is part of the one before it.
+        """
+        reached = self.reached if where is None else self.reached[where]
+        offer = self.offer if where is None else self.offer[where]
+        # Applications at stage s reached every stage before it: count per stage, then sum from the end
+        at_stage = np.bincount(reached, minlength=self.rounds + 2)
+        return np.append(np.cumsum(at_stage[::-1])[::-1], np.count_nonzero(offer & (reached >= self.offer_from)))
+
+    # Stage offers are converted from: round 1, or responded when there are no rounds
+    @property
+    def offer_from(self):
+        return 2 if self.rounds else 1
+
+    def time_in_stage(self, stage):
+        """
+        Distribution of the days applications spent in a stage before entering the next one, for
+        the applications with both dates. Not defined for the offer, which ends the funnel.
+
+        Args:
+            stage: Index of the stage in stages
+        """
+        if stage + 1 >= len(self.entered): # The last round only leads to the outcome, which has no date
+            return Distribution([])
+        spent = self.entered[stage + 1] - self.entered[stage]
+        return Distribution(spent[~np.isnan(spent) & (spent >= 0)])
+
+    def table(self, where=None):
+        """
+        The funnel as a table: one row per stage with the number of applications that reached
+        it, the conversion from the stage before and from applying, and the median days spent
+        in the stage. Offers are converted from the applications that interviewed, however many
+        rounds their process had.
+        """
+        counts = self.counts(where)
+        previous = np.append(np.concatenate([[counts[0]], counts[:-2]]), counts[self.offer_from])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            conversion = np.where(previous > 0, counts / previous * 100, np.nan)
+            overall = np.where(counts[0] > 0, counts / counts[0] * 100, np.nan)
+        median = [self.time_in_stage(stage).percentile(50) for stage in range(len(counts) - 1)] + [np.nan]
+        return pd.DataFrame({
+            "Stage": self.stages,
+            "Applications": counts,
+            "Conversion": conversion,
+            "Of Applied": overall,
+            "Median Days In Stage": median,
+        })
+
+    def matches(self):
+        """
+        Number of interviews per way of linking them (see MATCH_ROLE, MATCH_COMPANY, MATCH_NONE).
+        """
+        return pd.Series(self.match).value_counts().reindex([MATCH_ROLE, MATCH_COMPANY, MATCH_NONE], fill_value=0)
+
+# ---------------------------------------- FUNCTIONS
+
+# Dates as float days since the epoch, NaN where missing
+def days(dates):
+    values = to_days(dates)
+    out = values.astype(np.int64).astype(float)
+    out[np.isnat(values)] = np.nan
+    return out
+
+def encoded(column):
+    """
+    Integer codes of a column (-1 where missing) and its distinct values, as objects.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype): # Already encoded at load time
+        return column.cat.codes.to_numpy(), column.cat.categories.to_numpy(dtype=object)
+    codes, labels = pd.factorize(column)
+    return codes, np.asarray(labels, dtype=object)
+
+def shared_codes(left, right):
+    """
+    Integer codes of two text columns in one shared numbering of their normalized values: case
+    and spacing are folded, so "Acme  Corp" matches "acme corp". Only the distinct values of
+    both columns are normalized, not the rows. Missing values get -1.
+    """
+    left_codes, left_labels = encoded(left)
+    right_codes, right_labels = encoded(right)
+    raw, distinct = pd.factorize(np.concatenate([left_labels, right_labels]))
+    normal, _ = pd.factorize(np.array([" ".join(str(label).casefold().split()) for label in distinct], dtype=object))
+    table = normal[raw]
+    # One extra -1 slot at the end for missing values, which have code -1
+    left_table = np.append(table[:len(left_labels)], -1)
+    right_table = np.append(table[len(left_labels):], -1)
+    return left_table[left_codes], right_table[right_codes]
+
+def join_keys(apps, interviews, columns):
+    """
+    Shared integer keys of the applications and interviews on the normalized columns, -1 when a
+    column is missing.
+    """
+    app_keys = interview_keys = None
+    for col in columns:
+        app_codes, interview_codes = shared_codes(apps[col], interviews[col])
+        if app_keys is None:
+            app_keys, interview_keys = app_codes, interview_codes
+            continue
+        # Pairs of codes packed into one, then re-encoded to keep them small
+        size = max(app_codes.max(initial=-1), interview_codes.max(initial=-1)) + 1
+        packed = np.concatenate([
+            np.where((app_keys < 0) | (app_codes < 0), -1, app_keys * size + app_codes),
+            np.where((interview_keys < 0) | (interview_codes < 0), -1, interview_keys * size + interview_codes),
+        ])
+        packed = np.where(packed < 0, -1, pd.factorize(packed)[0])
+        app_keys, interview_keys = packed[:len(apps)], packed[len(apps):]
+    return app_keys, interview_keys
+
+def nearest(app_keys, app_days, interview_keys, interview_days):
+    """
+    For every interview, the last application with the same key dated on or before it, else the
+    first one after it. Returns the application rows, -1 when the key has no application.
+    Applications without a date come before any dated one, interviews without a date after.
+    """
+    result = np.full(len(interview_keys), -1, dtype=np.int64)
+    if not len(app_keys) or not len(interview_keys):
+        return result
+    known = ~np.isnan(app_days)
+    lo = np.nanmin(app_days) if known.any() else 0
+    hi = np.nanmax(app_days) if known.any() else 0
+    # Day slots from 1 (undated applications, and interviews before the first application) to
+    # span - 1 (undated interviews)
+    span = int(hi - lo) + 4
+    app_slot = np.where(known, app_days - lo + 2, 1).astype(np.int64)
+    interview_slot = np.where(np.isnan(interview_days), span - 1, np.clip(interview_days - lo + 2, 1, span - 2)).astype(np.int64)
+
+    order = np.flatnonzero(app_keys >= 0)
+    composite = app_keys[order] * span + app_slot[order]
+    sort = np.argsort(composite, kind="stable")
+    order, composite = order[sort], composite[sort]
+    sorted_keys = app_keys[order]
+
+    valid = interview_keys >= 0
+    position = np.searchsorted(composite, interview_keys * span + interview_slot, side="right")
+    before = np.clip(position - 1, 0, len(order) - 1)
+    after = np.clip(position, 0, len(order) - 1)
+    has_before = valid & (position > 0) & (sorted_keys[before] == interview_keys)
+    has_after = valid & (position < len(order)) & (sorted_keys[after] == interview_keys)
+    result[has_after] = order[after[has_after]]
+    result[has_before] = order[before[has_before]]
+    return result
+
+def join(apps, interviews, app_days=None, interview_days=None):
+    """
+    Links every interview to its application (see the module docstring).
+
+    Args:
+        apps, interviews: The Tracker and Interviews sheets
+        app_days, interview_days: Their dates as days (see days), computed when not given
+
+    Returns:
+        The Tracker row of every interview (-1 when not linked), and how it was linked
+    """
+    match = np.full(len(interviews), MATCH_NONE, dtype=object)
+    if not len(interviews) or "Company" not in apps.columns or "Company" not in interviews.columns:
+        return np.full(len(interviews), -1, dtype=np.int64), match
+    # Trackers of a cohort are never linked to each other
+    scope = [constants.SOURCE] if constants.SOURCE in apps.columns and constants.SOURCE in interviews.columns else []
+    if app_days is None:
+        app_days = days(apps["Date"]) if "Date" in apps.columns else np.full(len(apps), np.nan)
+    if interview_days is None:
+        interview_days = days(interviews["Date"]) if "Date" in interviews.columns else np.full(len(interviews), np.nan)
+
+    link = np.full(len(interviews), -1, dtype=np.int64)
+    passes = [(MATCH_ROLE, scope + ["Company", "Role Type"]), (MATCH_COMPANY, scope + ["Company"])]
+    for name, columns in passes:
+        if not all(col in apps.columns and col in interviews.columns for col in columns):
+            continue
+        unlinked = np.flatnonzero(link < 0)
+        if not len(unlinked):
+            break
+        app_keys, interview_keys = join_keys(apps, interviews.iloc[unlinked], columns)
+        found = nearest(app_keys, app_days, interview_keys, interview_days[unlinked])
+        link[unlinked] = found
+        match[unlinked[found >= 0]] = name
+    return link, match
+
+def first_days(linked_apps, rounds, interview_days, n_apps, n_rounds):
+    """
+    Day of the first interview of every round, per application.
+
+    Returns:
+        A list of n_rounds arrays (one per round) of n_apps days, NaN when the application has no
+        dated interview in that round
+    """
+    entered = [np.full(n_apps, np.nan) for _ in range(n_rounds)]
+    dated = ~np.isnan(interview_days)
+    if not dated.any():
+        return entered
+    keys = linked_apps[dated] * (n_rounds + 1) + rounds[dated]
+    # Sorted by key then day, so the first row of every key is its earliest interview
+    order = np.lexsort((interview_days[dated], keys))
+    unique, first = np.unique(keys[order], return_index=True)
+    earliest = interview_days[dated][order[first]]
+    for k in range(1, n_rounds + 1):
+        in_round = unique % (n_rounds + 1) == k
+        entered[k - 1][unique[in_round] // (n_rounds + 1)] = earliest[in_round]
+    return entered
+
+# The funnel of a dataset, built once per loaded workbook
+def funnel(apps, interviews):
+    return loader.derived(apps, ("funnel", id(interviews)), lambda: Funnel(apps, interviews))
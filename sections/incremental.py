@@ -0,0 +1,82 @@
+"""
+Incremental
+
+Trackers get re-uploaded with a few appended rows and some edited cells. Every row of a loaded
+sheet is fingerprinted, and when the previous version of the same tracker is still cached the
+rows are compared position by position. Aggregates that know how to apply a change (see
+aggregate.tables and aggregate.rolled_up) are then updated from the previous version's
+aggregates instead of being recomputed from every row.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.loader as loader
+import sections.profiling as profiling
+
+# Above this share of changed rows (ex: the sheet was sorted) a full recompute is cheaper
+MAX_CHANGED_FRACTION = 0.25
+# Smaller sheets are recomputed, comparing the rows costs more than it saves
+MIN_ROWS = 50_000
+
+class Changes:
+    """
+    The rows that differ between two versions of a sheet. removed_rows are the rows of the
+    previous version that were edited or deleted, added_rows the rows that replace them
+    or were appended.
+    """
+    def __init__(self, previous, sheet, removed, added):
+        self.previous = previous
+        self.removed_rows = previous.iloc[removed]
+        self.added_rows = sheet.iloc[added]
+
+    def __len__(self):
+        return max(len(self.removed_rows), len(self.added_rows))
+
+# ---------------------------------------- FUNCTIONS
+
+# One 64-bit hash per row, of the row's values
+def fingerprints(sheet):
+    return loader.derived(sheet, "fingerprints", lambda: pd.util.hash_pandas_object(sheet, index=False).to_numpy())
+
+@profiling.timed("derive")
+def changes(sheet):
+    """
+    Compares a loaded sheet with the previous version of the same tracker, row by row.
+
+    Returns:
+        The Changes, or None when the sheet is small, there's no cached previous version,
+        the columns differ, or too many rows changed for an update to pay off
+    """
+    if len(sheet) < MIN_ROWS:
+        return None
+    previous = loader.previous(sheet)
+    if previous is None or list(previous.columns) != list(sheet.columns):
+        return None
+    old, new = fingerprints(previous), fingerprints(sheet)
+    common = min(len(old), len(new))
+    edited = np.flatnonzero(old[:common] != new[:common])
+    removed = np.concatenate([edited, np.arange(common, len(old))])
+    added = np.concatenate([edited, np.arange(common, len(new))])
+    if max(len(removed), len(added)) > MAX_CHANGED_FRACTION * max(len(new), 1):
+        return None
+    return Changes(previous, sheet, removed, added)
+
+def cached(sheet, name, full, update):
+    """
+    An object derived from a loaded sheet (like loader.derived), updated from the same object of
+    the sheet's previous version when that one was computed and only a few rows changed.
+
+    Args:
+        sheet: A sheet returned by the loader
+        name: Name of the derived object
+        full: Function computing the object from every row
+        update: Function taking the previous object and the Changes, returning the new object
+    """
+    def build():
+        change = changes(sheet)
+        if change is not None:
+            old = loader.peek(change.previous, name)
+            if old is not None:
+                return update(old, change)
+        return full()
+    return loader.derived(sheet, name, build)
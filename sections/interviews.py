@@ -1,10 +1,12 @@
 import streamlit as st
-from  streamlit_vertical_slider import vertical_slider 
 import altair as alt
 
 # Homebrew files
+import sections.charts as charts
 import sections.constants as constants
-from sections.methods import *
+import sections.funnel as funnel
+import sections.profiling as profiling
+from sections.metrics import INTERVIEW_DIMS, INTERVIEW_MEASURES
 
 # Color constants
 color1 = constants.COLOR1
@@ -12,61 +14,24 @@ color2 = constants.COLOR2
 gradient = [color1, color2]
 barcolor = "turbo"
 
-def show(apps, interviews, grahams):
+def show(model, grahams):
     st.title("Interview Data")
     try:
         # ----------------------------------------------- Constants
         # Interview metrics
-        num_interviewed_at = sum(1 for app_stat in apps["Status"].dropna() if app_stat in constants.REAL_RESP)
-        sum_interviews = interviews[interviews.columns[0]].dropna().count() # NOT sum of apps interview column cause duplicates
-
-        num_weeks = apps["Week"].max() # Number of weeks for later calc
-
-        avg_int_per_role = apps['Number of Interviews'].dropna().mean()
-
-        interview_max = apps['Number of Interviews'].dropna().max()
-        interview_max_company = apps.iloc[int(apps['Number of Interviews'].dropna().idxmax()), 0]
+        num_interviewed_at = model.real_response_number
+        sum_interviews = model.sum_interviews
+        num_weeks = model.num_weeks # Number of weeks for later calc
+        avg_int_per_role = model.avg_int_per_role
+        interview_max = model.interview_max
+        interview_max_company = model.interview_max_company
 
         # ----------------------------------------------- Dataframes
-        weekly_df = groupby_percents(apps, "Week")
-        if weekly_df.iloc[len(weekly_df)-1][0] < 0: # Drop extra auto values if they exist
-            weekly_df = weekly_df.drop(0) 
-
-        # Multiple agg groupbys - can't use the function I made
-        # Number of rounds
-        int_round_df = interviews.groupby(['Round', 'Type of Interview', 'Location']).agg({
-                'Company': 'count',
-                'Performance': 'mean',
-                'Experience': 'mean'
-            }).reset_index().sort_values("Round")
-        just_round_df = interviews.groupby("Round").agg({
-                'Company': 'count',
-                'Performance': 'mean',
-                'Experience': 'mean'
-            }).rename(columns={
-                'Company': "Number of Interviews"
-            }).reset_index().sort_values("Round")
-        # Type of role
-        int_role_df = interviews.groupby(['Role Type', 'Type of Interview', 'Location']).agg({
-                'Company': 'count',
-                'Round': 'mean',
-                'Performance': 'mean',
-                'Experience': 'mean'
-            }).reset_index().sort_values("Company", ascending=False)
-        just_role_df = interviews.groupby('Role Type').agg({
-                'Company': 'count',
-                'Round': 'mean',
-                'Performance': 'mean',
-                'Experience': 'mean'
-            }).reset_index().sort_values("Company", ascending=False)
-        # Location
-        int_loc_df = interviews.groupby('Location').agg({
-                'Company': 'count'
-            }).reset_index().sort_values("Company", ascending=False)
-        # Type of interview
-        int_type_df = interviews.groupby('Type of Interview').agg({
-                'Company': 'count'
-            }).reset_index().sort_values("Company", ascending=False)
+        weekly_df = model.weekly
+        int_round_df = model.interview_tables["round_detail"]
+        just_round_df = model.interview_tables["round"]
+        int_role_df = model.interview_tables["role_detail"]
+        just_role_df = model.interview_tables["role"]
 
         # ----------------------------------------------- Calculations
         st.header("Interviews")
@@ -80,7 +45,7 @@ def show(apps, interviews, grahams):
                 tooltip=['Week', 'Interviews'],
                 color=alt.value(color1)
             )
-            st.altair_chart(chart, use_container_width=True)
+            profiling.altair_chart(chart, use_container_width=True)
             st.text("Note: This chart shows the number of interviews per week based on when the application was sent, not when the actual interview occured. This helps show how successful a resume is on any given week and how changes to a resume impact interviews.")
             st.text("There's usually a 2-3 week lag time in getting interviews due to response time turnaround.") 
         with matrix6:
@@ -91,7 +56,7 @@ def show(apps, interviews, grahams):
                 tooltip=['Round', 'Number of Interviews'],
                 color=alt.value(color2)
             )
-            st.altair_chart(round_chart, use_container_width=True)
+            profiling.altair_chart(round_chart, use_container_width=True)
             st.text("'Rounds' are defined by a progression in an interview process. For example, going in-person to an interview for 3 back-to-back meetings is considered only one round, even if 3 meetings occured. If multiple interviews happen for the same stage on different dates, they are considered the same round but separate interviews (ie: meeting with 3 people, but each interview is scheduled for a different day.)")
 
         # Metrics
@@ -104,6 +69,9 @@ def show(apps, interviews, grahams):
             st.metric("Total interviews:", int(sum_interviews))
             st.text("Note: The total interviews metric may not line up with the number of interviews reported in the 'Applications' spreadsheet. This is because interviews may be tagged to more than one role. For example, a company may use a first-round phone call to consider an applicant for two or more roles.")
             st.metric("Longest interview process:", '{0:.2g}'.format(interview_max) + " interviews (" + interview_max_company + ")")
+            reconciled, logged = model.reconciled_interviews
+            st.metric("Interviews linked to an application:", f"{int(model.funnel.matches().drop(funnel.MATCH_NONE).sum())} of {int(sum_interviews)}")
+            st.text(f"Interviews are linked to the application for the same company and role sent closest before them, or to the company's application when the role doesn't match. For {reconciled} of the {logged} applications with interviews, the linked interviews match the 'Number of Interviews' column.")
 
         st.html("<hr>")
 
@@ -111,17 +79,9 @@ def show(apps, interviews, grahams):
         st.subheader("Heatmap of interviews:")
         cal1, cal2, cal3 = st.columns([1,4,1])
         with cal2:
-            interviews['Date'] = pd.to_datetime(interviews['Date'], format='%d-%b-%Y')
-            # Step 2: Count occurrences per day
-            daily_counts = interviews['Date'].value_counts().reset_index()
-            daily_counts.columns = ['date', 'count']
-            daily_counts = daily_counts.sort_values('date')
-            # Step 3: Add calendar fields
-            daily_counts['day'] = daily_counts['date'].dt.dayofweek     # 0 = Monday
-            daily_counts['week'] = daily_counts['date'].dt.isocalendar().week
-            daily_counts['month'] = daily_counts['date'].dt.strftime('%B')
-            # Step 4: Plot calendar-style heatmap
-            heatmap = alt.Chart(daily_counts).mark_rect().encode(
+            daily_counts = model.interview_days
+            # Plot calendar-style heatmap
+            heatmap = alt.Chart(charts.project(daily_counts, ["week", "day", "count", "date"])).mark_rect().encode(
                 x=alt.X('week:O', title='Week Number'),
                 y=alt.Y('day:O', title='Day of Week',
                     sort=[0, 1, 2, 3, 4, 5, 6],
@@ -132,32 +92,23 @@ def show(apps, interviews, grahams):
                     color=alt.Color('count:Q', scale=alt.Scale(range=gradient), title='Frequency'),
                     tooltip=['date:T', 'count:Q']
                 )
-            st.altair_chart(heatmap, use_container_width=True)
+            profiling.altair_chart(heatmap, use_container_width=True)
+        st.html("<hr>")
+
+        # Hiring funnel
+        st.subheader("Hiring Funnel")
+        hiring_funnel(model)
         st.html("<hr>")
 
         # Selectbox for interview stats
         st.subheader("Breakdown of Interviews")
-        color_field = st.selectbox(
-            "Choose to color by:",
-            options=["Type of Interview", "Location"]
-            )
-        r1, r2 = st.columns(2, border=True, gap='medium')
-        with r1:
-            st.subheader("Grouped by NUMBER OF ROUNDS:")
-            round = alt.Chart(int_round_df).mark_bar().encode(
-                x=alt.X("Round:O", title="Interview Round"),
-                y=alt.Y("Company:Q", title="Count"),
-                color=alt.Color(f'{color_field}:N', title=color_field, scale=alt.Scale(scheme=barcolor)),
-            )
-            st.altair_chart(round, use_container_width=True)
-        with r2:
-            st.subheader("Grouped by ROLE TYPE:")
-            role = alt.Chart(int_role_df).mark_bar().encode(
-                x=alt.X("Role Type:O", title="Role Type"),
-                y=alt.Y("Company:Q", title="Count"),
-                color=alt.Color(f'{color_field}:N', title=color_field, scale=alt.Scale(scheme=barcolor)),
-            )
-            st.altair_chart(role, use_container_width=True)
+        interview_breakdown(int_round_df, int_role_df)
+        interview_drilldown(model)
+
+        # Cohort info
+        if model.cohort_interviews is not None:
+            st.subheader("Interviews by Tracker")
+            st.dataframe(model.cohort_interviews, hide_index=True)
 
         st.subheader("Breakdown By (Perceived) Performance")
         st.text("Performance measures how well I adapted to the interview and how successful I feel I was.")
@@ -175,7 +126,7 @@ def show(apps, interviews, grahams):
                 y=alt.Y("Experience:Q", title="Experience")
             )
             layered_chart = alt.layer(rounde, roundp)
-            st.altair_chart(layered_chart)  # or use layered_chart
+            profiling.altair_chart(layered_chart)  # or use layered_chart
         with r2:
             # Rounds line chart
             melted = just_role_df.melt(
@@ -194,7 +145,91 @@ def show(apps, interviews, grahams):
                 tooltip=['Role Type', 'Metric', 'Value']
             ).properties(width=500)
 
-            st.altair_chart(chart, use_container_width=True)
+            profiling.altair_chart(chart, use_container_width=True)
 
     except:
-        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
\ No newline at end of file
+        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
+
+# Reruns on its own when the selectbox changes, so only these two charts are rebuilt
+@st.fragment
+def interview_breakdown(int_round_df, int_role_df):
+    color_field = st.selectbox(
+        "Choose to color by:",
+        options=["Type of Interview", "Location"]
+        )
+    r1, r2 = st.columns(2, border=True, gap='medium')
+    with r1:
+        st.subheader("Grouped by NUMBER OF ROUNDS:")
+        round = alt.Chart(charts.summed(int_round_df, ["Round", color_field], "Company")).mark_bar().encode(
+            x=alt.X("Round:O", title="Interview Round"),
+            y=alt.Y("Company:Q", title="Count"),
+            color=alt.Color(f'{color_field}:N', title=color_field, scale=alt.Scale(scheme=barcolor)),
+        )
+        profiling.altair_chart(round, use_container_width=True)
+    with r2:
+        st.subheader("Grouped by ROLE TYPE:")
+        role = alt.Chart(charts.summed(int_role_df, ["Role Type", color_field], "Company")).mark_bar().encode(
+            x=alt.X("Role Type:O", title="Role Type"),
+            y=alt.Y("Company:Q", title="Count"),
+            color=alt.Color(f'{color_field}:N', title=color_field, scale=alt.Scale(scheme=barcolor)),
+        )
+        profiling.altair_chart(role, use_container_width=True)
+
+# Reruns on its own when the selections change - every table is summed from the interview cube
+@st.fragment
+def interview_drilldown(model):
+    st.subheader("Drill Down")
+    st.text("Pick what to group the interviews by, then narrow down to the rounds, roles, types and locations you want to compare.")
+    cube = model.interview_cube
+    by = st.selectbox("Group by:", options=INTERVIEW_DIMS)
+    where = {}
+    drill_columns = st.columns(len(INTERVIEW_DIMS) - 1)
+    for col, dim in zip(drill_columns, [dim for dim in INTERVIEW_DIMS if dim != by]):
+        with col:
+            options = cube.index.get_level_values(dim).dropna().unique().tolist()
+            picked = st.multiselect(dim + ":", options=sorted(options, key=str))
+            if picked:
+                where[dim] = picked
+    # Average round is only meaningful when not grouping by round
+    measures = {col: agg for col, agg in INTERVIEW_MEASURES.items() if col != by}
+    table = model.interview_view(by, measures, where).rename(columns={
+            'Company': "Number of Interviews",
+            'Round': "Avg Round"
+        }).reset_index()
+    st.dataframe(table, hide_index=True)
+
+# Reruns on its own when the stage changes, so only the time in stage chart is rebuilt
+@st.fragment
+def hiring_funnel(model):
+    table = model.funnel_table
+    f1, f2 = st.columns(2, border=True, gap="medium")
+    with f1:
+        stages = alt.Chart(table).mark_bar().encode(
+            x=alt.X("Applications:Q", title="Applications"),
+            y=alt.Y("Stage:N", sort=None, title="Stage"),
+            tooltip=["Stage", "Applications", alt.Tooltip("Conversion:Q", format=".1f"), alt.Tooltip("Of Applied:Q", format=".1f")],
+            color=alt.value(color2)
+        )
+        profiling.altair_chart(stages, use_container_width=True)
+        st.dataframe(table.style.format({
+            "Conversion": "{:.1f}%",
+            "Of Applied": "{:.1f}%",
+            "Median Days In Stage": "{:.0f}",
+        }, na_rep="-"), hide_index=True)
+        st.text("Conversion is the share of the previous stage that made it to this one. Offers are counted among the applications that got a first round, as a share of them - offers without a linked interview are left out.")
+    with f2:
+        stage = st.selectbox("Time spent in stage:", options=list(table["Stage"][:-1]))
+        spent = model.funnel.time_in_stage(list(table["Stage"]).index(stage))
+        if len(spent):
+            bins = spent.histogram(1, "Days")
+            hist = alt.Chart(bins).mark_bar().encode(
+                alt.X("Days:Q", bin=alt.Bin(binned=True, step=1), title="Days Until The Next Stage"),
+                x2="Days_end:Q",
+                y=alt.Y("count:Q", title="Number of Applications"),
+                tooltip=[alt.Tooltip("Days:Q"), alt.Tooltip("count:Q", title="Count of Records")],
+                color=alt.value(color1)
+            )
+            profiling.altair_chart(hist, use_container_width=True)
+            st.text(f"Median {spent.percentile(50):.0f} days, 90th percentile {spent.percentile(90):.0f} days ({len(spent)} applications).")
+        else:
+            st.text("No application has dates for both this stage and the next one.")
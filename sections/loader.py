@@ -0,0 +1,601 @@
+"""
+Loader
+"""
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import sections.constants as constants
+import sections.dates as dates
+import sections.profiling as profiling
+import sections.schema as schema
+
+# Sheets every page reads from. Weights is optional, it only scores a ROE Calculation sheet that's out of date
+SHEETS = ["Tracker", "ROE Calculation", "Interviews", "Weights"]
+
+# Cache limits - the cache lives at module level so it is shared by every session on the server
+CACHE_MAX_ENTRIES = 16
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Columnar sidecars - one Arrow IPC file per sheet, in a folder named by the workbook's content hash
+SIDECAR_DIR = ".cache/trackers"
+SIDECAR_MAX_ENTRIES = 32
+# Bumped when the sheets a sidecar holds change, so older sidecars are parsed again
+SIDECAR_VERSION = 3
+
+# Rows the streaming reader collects before converting them to compact columns
+STREAM_CHUNK_ROWS = 50_000
+
+# ---------------------------------------- CACHE
+
+class WorkbookCache:
+    """
+    Thread-safe LRU cache of parsed workbooks.
+
+    Bounded by both the number of workbooks and their total memory: the cached DataFrames and
+    the objects derived from them. Least recently used workbooks are evicted first. Cached
+    frames are shared, so callers must treat them as read-only. Objects derived from a workbook
+    (indexes, metrics) are stored with it and evicted with it.
+
+    Entries are [sheets, bytes of the sheets, derived objects, bytes of the derived objects].
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._previous = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, sheets, derived=None):
+        size = sheets_nbytes(sheets)
+        derived = dict(derived or {})
+        derived_size = objects_nbytes(derived.values(), sheets.values())
+        if size + derived_size > self.max_bytes: # Never cache something that would evict everything else
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1] + old[3]
+            self._entries[key] = [sheets, size, derived, derived_size]
+            self._bytes += size + derived_size
+            self._evict()
+
+    # Drops least recently used workbooks until the cache is within its limits. Call with the lock held
+    def _evict(self, keep=None):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            dropped_key = next(iter(self._entries))
+            if dropped_key == keep: # The workbook being used stays, even alone over the limit
+                if len(self._entries) == 1:
+                    return
+                self._entries.move_to_end(keep)
+                continue
+            dropped = self._entries.pop(dropped_key)
+            self._bytes -= dropped[1] + dropped[3]
+            self._previous.pop(dropped_key, None)
+
+    def measure(self, frame):
+        """
+        Measures again the objects derived from a cached sheet's workbook (they can grow after
+        they're stored, ex: lazily computed tables) and evicts other workbooks if it's now over
+        the limit.
+        """
+        with self._lock:
+            key, _, entry = self._find(frame)
+            if entry is None:
+                return
+            values = list(entry[2].values())
+        # Measured without the lock, objects can be large
+        size = objects_nbytes(values, entry[0].values())
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            self._bytes += size - entry[3]
+            entry[3] = size
+            self._evict(keep=key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def link(self, key, previous_key):
+        """
+        Records that a workbook is a new version of another one (ex: the same tracker uploaded again).
+        """
+        with self._lock:
+            if key in self._entries and key != previous_key:
+                self._previous[key] = previous_key
+
+    # Key and sheet name of a cached frame, and its workbook's entry. Call with the lock held
+    def _find(self, frame):
+        for key, entry in self._entries.items():
+            for name, df in entry[0].items():
+                if df is frame:
+                    return key, name, entry
+        return None, None, None
+
+    def previous(self, frame):
+        """
+        The same sheet of the previous version of a cached sheet's workbook, if it's still cached.
+        """
+        with self._lock:
+            key, name, _ = self._find(frame)
+            entry = self._entries.get(self._previous.get(key))
+            return entry[0].get(name) if entry is not None else None
+
+    def peek(self, frame, name):
+        """
+        An object derived from a cached sheet if it was already built, otherwise None.
+        """
+        with self._lock:
+            _, sheet, entry = self._find(frame)
+            return entry[2].get((sheet, name)) if entry is not None else None
+
+    def derived(self, frame, name, build):
+        """
+        Returns an object computed from one of the cached sheets, building it only once.
+
+        Args:
+            frame: A sheet returned by load_workbook (matched by identity)
+            name: Name of the derived object (names only need to be unique per sheet)
+            build: Function that computes the object
+        """
+        with self._lock:
+            _, sheet, entry = self._find(frame)
+            store = entry[2] if entry is not None else None
+            if store is not None and (sheet, name) in store:
+                return store[(sheet, name)]
+        value = build()
+        if store is not None: # Frames that aren't cached (filtered, too large) are rebuilt every time
+            with self._lock:
+                value = store.setdefault((sheet, name), value)
+            self.measure(frame)
+        return value
+
+    def derived_objects(self, key):
+        """
+        Copy of every object derived from a cached workbook, keyed by (sheet name, name).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry[2]) if entry is not None else {}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._previous.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+_cache = WorkbookCache()
+# Deep memory usage of derived frames by id, measured once - they're read-only once cached
+_frame_sizes = {}
+
+# ---------------------------------------- FUNCTIONS
+
+# Deep memory usage of every sheet, including string contents
+def sheets_nbytes(sheets):
+    return sum(int(df.memory_usage(deep=True).sum()) for df in sheets.values() if df is not None)
+
+def frame_nbytes(frame):
+    known = _frame_sizes.get(id(frame))
+    if known is not None and known[0]() is frame:
+        return known[1]
+    size = int(frame.memory_usage(deep=True).sum()) if isinstance(frame, pd.DataFrame) else int(frame.memory_usage(deep=True))
+    key = id(frame)
+    # Forgotten when the frame is garbage collected, so a new object with the same id is measured
+    _frame_sizes[key] = (weakref.ref(frame, lambda _: _frame_sizes.pop(key, None)), size)
+    return size
+
+def objects_nbytes(values, skip=()):
+    """
+    Estimated memory of objects derived from sheets: the frames and arrays they hold, followed
+    through containers and the attributes of the app's own classes. Objects reached twice are
+    counted once.
+
+    Args:
+        values: The objects
+        skip: Objects already counted (ex: the sheets the objects hold on to)
+    """
+    seen = {id(value) for value in skip}
+    stack = list(values)
+    total = 0
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+            total += frame_nbytes(value)
+        elif isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, dict):
+            total += sys.getsizeof(value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(value)
+            stack.extend(value)
+        elif type(value).__module__.startswith("sections.") and hasattr(value, "__dict__"):
+            # Models, indexes, time series... - cached_property values live in __dict__
+            total += sys.getsizeof(value)
+            stack.extend(vars(value).values())
+        else:
+            total += sys.getsizeof(value)
+    return total
+
+# Cache keys: uploads are keyed by their content, files on disk by path + mtime + size
+def bytes_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def path_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+@profiling.timed("load")
+def read_workbook(source):
+    """
+    Opens a workbook once and parses every sheet the app uses from that single open.
+    .xlsx workbooks are streamed (see stream_sheet), anything else is parsed by pandas.
+
+    Args:
+        source: A file path or a binary file-like object
+    Returns:
+        A dict of sheet name -> DataFrame, with None for sheets that are missing
+    """
+    # Only needed when a workbook is parsed, not when it comes from the cache, a sidecar or a snapshot
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+    try:
+        book = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile): # Not an .xlsx (ex: .xls)
+        if hasattr(source, "seek"):
+            source.seek(0)
+        with pd.ExcelFile(source) as xls:
+            return {name: xls.parse(name) if name in xls.sheet_names else None for name in SHEETS}
+    try:
+        return {name: stream_sheet(book[name], constants.SHEET_DTYPES[name]) if name in book.sheetnames else None
+                for name in SHEETS}
+    finally:
+        book.close()
+
+# ---------------------------------------- STREAMING
+
+# Column names of a header row, named like pandas does: "Unnamed: i" for blanks, "name.1" for repeats
+def header_names(row):
+    row = list(row)
+    while row and row[-1] is None:
+        row.pop()
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None else str(value) if not isinstance(value, str) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def stream_sheet(sheet, dtypes, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Reads a worksheet row by row (openpyxl read-only mode), keeping only the columns in dtypes
+    and the sheet's first column. Rows are collected in chunks that are converted to the compact
+    schema before the next chunk is read, so memory stays bounded by the kept columns. Reading
+    stops at the first fully empty row.
+
+    Args:
+        sheet: An openpyxl read-only worksheet
+        dtypes: The compact schema of the sheet, ex: constants.APPS_DTYPES
+        chunk_rows: Rows per chunk
+    Returns:
+        A DataFrame of the kept columns. df.attrs["header"] has every column name of the sheet
+    """
+    from openpyxl.cell.cell import ERROR_CODES
+    sheet.reset_dimensions() # Saved dimensions can be wrong, read until the data ends
+    rows = sheet.iter_rows(values_only=True)
+    header = header_names(next(rows, ()))
+    keep = [i for i, name in enumerate(header) if i == 0 or name in dtypes]
+    names = [header[i] for i in keep]
+
+    chunks = []
+    buffer = [[] for _ in keep]
+    def flush():
+        chunk = pd.DataFrame({name: pd.Series(values, dtype=None if values else object) for name, values in zip(names, buffer)})
+        chunks.append(schema.compact(chunk, dtypes))
+        for values in buffer:
+            values.clear()
+
+    for row in rows:
+        if all(value is None or value == "" for value in row):
+            break
+        width = len(row)
+        for values, i in zip(buffer, keep):
+            value = row[i] if i < width else None
+            # Error cells (#REF!, #DIV/0!, ...) are missing values, like pandas reads them
+            values.append(None if isinstance(value, str) and value in ERROR_CODES else value)
+        if len(buffer[0]) >= chunk_rows:
+            flush()
+    if buffer and (buffer[0] or not chunks):
+        flush()
+
+    df = schema.concat(chunks) if chunks else pd.DataFrame()
+    df.attrs["header"] = header
+    return df
+
+# Every column name of a loaded sheet, including the ones the streaming reader left out
+def header(df):
+    return df.attrs.get("header", list(df.columns))
+
+# ---------------------------------------- SIDECARS
+
+def sidecar_folder(digest, sidecar_dir=SIDECAR_DIR):
+    return os.path.join(sidecar_dir, f"{digest}-v{SIDECAR_VERSION}")
+
+@profiling.timed("load")
+def read_sidecar(digest, sidecar_dir=SIDECAR_DIR):
+    """
+    Memory-maps the Arrow IPC sidecar of a workbook, if one was written before.
+
+    Args:
+        digest: Content hash of the workbook
+        sidecar_dir: Folder holding the sidecars
+    Returns:
+        A dict of sheet name -> DataFrame, or None when there is no sidecar
+    """
+    folder = sidecar_folder(digest, sidecar_dir)
+    if not os.path.isdir(folder):
+        return None
+    sheets = {}
+    try:
+        for name in SHEETS:
+            path = os.path.join(folder, name + ".arrow")
+            if os.path.exists(path):
+                table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+                sheets[name] = table.to_pandas()
+            else:
+                sheets[name] = None
+    except (pa.ArrowException, OSError): # Corrupt sidecar - parse the workbook again
+        shutil.rmtree(folder, ignore_errors=True)
+        return None
+    return sheets
+
+def write_sidecar(digest, sheets, sidecar_dir=SIDECAR_DIR):
+    """
+    Writes parsed sheets to an Arrow IPC sidecar. The folder is written under a temporary
+    name and renamed into place, so readers never see a half-written sidecar.
+    Workbooks with columns Arrow can't store (ex: numbers mixed with text) are skipped.
+
+    Args:
+        digest: Content hash of the workbook
+        sheets: Dict of sheet name -> DataFrame (or None)
+        sidecar_dir: Folder holding the sidecars
+    Returns:
+        True if the sidecar was written
+    """
+    folder = sidecar_folder(digest, sidecar_dir)
+    try:
+        os.makedirs(sidecar_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=sidecar_dir, prefix=".tmp-")
+    except OSError: # Read-only deployments just skip the sidecar
+        return False
+    try:
+        for name, df in sheets.items():
+            if df is None:
+                continue
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(os.path.join(tmp, name + ".arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        os.replace(tmp, folder)
+    except (pa.ArrowException, OSError):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+    prune_sidecars(sidecar_dir)
+    return True
+
+# Keeps only the most recently written sidecars
+def prune_sidecars(sidecar_dir=SIDECAR_DIR, keep=SIDECAR_MAX_ENTRIES):
+    folders = [entry for entry in os.scandir(sidecar_dir) if entry.is_dir() and not entry.name.startswith(".")]
+    folders.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in folders[keep:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+# ---------------------------------------- LOADING
+
+# Cache key of a source, and its bytes when they had to be read to compute it
+def source_key(source):
+    if hasattr(source, "getvalue"):
+        data = source.getvalue()
+        return bytes_key(data), data
+    return path_key(source), None
+
+def read_bytes(source, data=None):
+    if data is not None:
+        return data
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    with open(source, "rb") as f:
+        return f.read()
+
+def parse_bytes(data):
+    """
+    Parses workbook bytes, going through the columnar sidecar. Module level so it can run in a worker process.
+
+    Args:
+        data: The raw bytes of the workbook
+    Returns:
+        A dict of sheet name -> DataFrame in the compact schema, with the date dimension (None when the sheet is missing)
+    """
+    # Sidecars are keyed by content, so an edited workbook never matches a stale sidecar
+    digest = bytes_key(data)
+    sheets = read_sidecar(digest)
+    if sheets is not None:
+        # Already compact and dated, unless the sidecar was written before a schema change
+        return dates.add_dates(schema.compact_sheets(sheets))
+    sheets = dates.add_dates(schema.compact_sheets(read_workbook(io.BytesIO(data))))
+    write_sidecar(digest, sheets)
+    return sheets
+
+@profiling.timed("load")
+def load_workbook(source, versions=None):
+    """
+    Returns the parsed sheets of a workbook. Checks the in-memory cache first, then the
+    columnar sidecar, and only parses the Excel file when neither has it.
+
+    Args:
+        source: A file path, or an uploaded file (anything with a getvalue() method)
+        versions: Dict of file name -> cache key of the last workbook loaded with that name, kept
+            by the caller (ex: in a session's state, so other users' files are never linked).
+            A file with the same name as an earlier one is treated as its new version (see
+            previous). None links nothing
+    Returns:
+        The cache key and a dict of sheet name -> DataFrame (None when the sheet is missing)
+    """
+    key, data = source_key(source)
+    sheets = _cache.get(key)
+    parsed = sheets is None
+    if parsed:
+        sheets = parse_bytes(read_bytes(source, data))
+        _cache.put(key, sheets)
+    if versions is not None:
+        # Versions that were evicted can't be linked to anymore
+        for name in [name for name, version in versions.items() if version not in _cache]:
+            del versions[name]
+        name = source_name(source)
+        if parsed and name in versions:
+            _cache.link(key, versions[name])
+        versions[name] = key
+    return key, sheets
+
+@profiling.timed("load")
+def load_workbooks(sources, workers=None):
+    """
+    Loads several workbooks, parsing the ones that aren't cached in parallel worker processes.
+
+    Args:
+        sources: File paths and/or uploaded files
+        workers: Maximum number of processes, defaults to the number of CPUs
+    Returns:
+        A list of (cache key, sheets) in the order of sources. Sheets is None for a file that can't be parsed
+    """
+    keys, datas = zip(*[source_key(source) for source in sources]) if sources else ((), ())
+    results = [_cache.get(key) for key in keys]
+    misses = [i for i, sheets in enumerate(results) if sheets is None]
+
+    def store(i, parse):
+        try:
+            results[i] = parse()
+            _cache.put(keys[i], results[i])
+        except Exception:
+            results[i] = None
+
+    if len(misses) > 1:
+        max_workers = min(len(misses), workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {i: pool.submit(parse_bytes, read_bytes(sources[i], datas[i])) for i in misses}
+            for i, future in futures.items():
+                store(i, future.result)
+    else:
+        for i in misses:
+            store(i, lambda: parse_bytes(read_bytes(sources[i], datas[i])))
+    return list(zip(keys, results))
+
+# Display name of a source: the uploaded file's name or the path's file name
+def source_name(source):
+    return getattr(source, "name", None) or os.path.basename(source)
+
+@profiling.timed("load")
+def load_cohort(sources, workers=None):
+    """
+    Loads several trackers and stacks each sheet into one dataset, with a "Source" column
+    naming the file every row came from. The combined sheets are cached like a workbook,
+    so every page (and derived object) for the cohort is only computed once.
+
+    Args:
+        sources: File paths and/or uploaded files
+        workers: Maximum number of parsing processes
+    Returns:
+        The cohort cache key, a dict of sheet name -> combined DataFrame (None when no file has
+        the sheet), and the names of the files that couldn't be parsed
+    """
+    members, skipped, seen = [], [], {}
+    for source, (key, sheets) in zip(sources, load_workbooks(sources, workers)):
+        name = source_name(source)
+        if sheets is None:
+            skipped.append(name)
+            continue
+        # Two files with the same name still get separate sources
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name} ({seen[name]})"
+        members.append((name, key, sheets))
+
+    key = "cohort:" + bytes_key("|".join(name + "=" + member_key for name, member_key, _ in members).encode())
+    sheets = _cache.get(key)
+    if sheets is None:
+        sheets = {}
+        for sheet in SHEETS:
+            frames = [member[sheet].assign(**{constants.SOURCE: name}) for name, _, member in members if member[sheet] is not None]
+            if not frames:
+                sheets[sheet] = None
+                continue
+            sheets[sheet] = schema.compact(schema.concat(frames), constants.SHEET_DTYPES[sheet])
+            # Every column any of the trackers has, for validation
+            sheets[sheet].attrs["header"] = list(dict.fromkeys([col for frame in frames for col in header(frame)] + [constants.SOURCE]))
+        _cache.put(key, sheets)
+    return key, sheets, skipped
+
+# Objects derived from a cached sheet - see WorkbookCache.derived
+def derived(frame, name, build):
+    return _cache.derived(frame, name, build)
+
+def peek(frame, name):
+    return _cache.peek(frame, name)
+
+def derived_objects(key):
+    return _cache.derived_objects(key)
+
+# Measures again what's derived from a cached sheet after it grew - see WorkbookCache.measure
+def measure(frame):
+    _cache.measure(frame)
+
+def install(key, sheets, derived=None):
+    """
+    Caches sheets that were parsed elsewhere (ex: a snapshot) under a cache key, with the
+    objects already derived from them. Does nothing when the key is already cached.
+    """
+    if _cache.get(key) is None:
+        _cache.put(key, sheets, derived)
+
+# The same sheet of the previously loaded version of a tracker - see WorkbookCache.previous
+def previous(frame):
+    return _cache.previous(frame)
+
+def clear_cache():
+    _cache.clear()
@@ -1,7 +1,8 @@
 """
 Methods
 """
-import sections.constants as constants
+import sections.aggregate as aggregate
+import sections.loader as loader
 import pandas as pd
 
 # ---------------------------------------- FUNCTIONS
@@ -16,10 +17,6 @@ def convert_to_st(df: pd.DataFrame, x: str, y: str):
     })
     return new_df
 
-# Used to count the valid responses in the Constants file
-def count_status(status_list):
-    return lambda x: x.isin(status_list).sum()
-
 # Returns a df in the right formatting
 def groupby_percents(sheet, col_name):
     """
@@ -28,46 +25,14 @@ def groupby_percents(sheet, col_name):
     Args:
         sheet: The Excel sheet to read, expects a dataframe
         col_name: The column to group on
-    """
-    return_df = sheet.groupby(col_name).agg(
-        Applications=('Status', 'count'),
-        Companies=('Company', pd.Series.nunique),
-        Interviews=('Number of Interviews', 'sum'),
-        Salary_Min=('Salary Min', 'mean'),
-        Salary_Max=('Salary Max', 'mean'),
-        All_Positive=('Status', count_status(constants.ALL_RESP)),
-        Real_Positive=('Status', count_status(constants.REAL_RESP)),
-        Response_Time=('Response Time (Days)', 'mean')
-    ).reset_index().sort_values("Applications", ascending=False)
-
-    # Calculate response % columns
-    return_df['Total Responses'] = return_df['All_Positive'] / return_df['Applications'] * 100
-    return_df['Total Responses'] = return_df['Total Responses'].apply('{:.1f}%'.format)
-    return_df['Real Responses'] = return_df['Real_Positive'] / return_df['Applications'] * 100
-    return_df['Real Responses'] = return_df['Real Responses'].apply('{:.1f}%'.format)
-
-    # Calculate salary and response columns
-    return_df['Salary_Min'] = return_df['Salary_Min'].apply('${:.2f}'.format)
-    return_df['Salary_Max'] = return_df['Salary_Max'].apply('${:.2f}'.format)
-    return_df['Response_Time'] = return_df['Response_Time'].apply('{:.2f}'.format)
 
-    # Drop calculation columns
-    return_df = return_df.drop('All_Positive', axis=1)
-    return_df = return_df.drop('Real_Positive', axis=1)
-    # Rename columns to more intuitive things
-    return_df = return_df.rename(columns={
-        'Applications': '# of Applications',
-        'Companies': '# of Companies',
-        'Salary_Min': 'Avg Min K',
-        'Salary_Max': 'Avg Max K',
-        'Response_Time': 'Avg DTR'
-    })
-
-    return return_df
+    Use aggregate.grouping_sets directly when grouping the same sheet on several columns.
+    """
+    return aggregate.grouping_sets(sheet, [col_name])[col_name]
 
 # For DFs that need less groupby fields
 def groupby_smaller(sheet, count, col_name, rename, sort):
-    return_df = sheet.groupby(col_name).agg({
+    return_df = aggregate.rolled_up(sheet, col_name, {
         count: 'count',
         'Number of Interviews': 'sum',
         'Response Time (Days)': 'mean'
@@ -103,7 +68,7 @@ def bar_text(chart, dy_val, quantity, prefix=None, datatype="N"):
 # Made to print extra columns
 def validate_columns(df: pd.DataFrame, expected_cols: list):
     """
-    Checks whether DataFrame has expected columns.
+    Checks whether DataFrame has expected columns. Columns the loader left out are still counted.
 
     Parameters:
         df (pd.DataFrame): The DataFrame to check.
@@ -112,7 +77,7 @@ def validate_columns(df: pd.DataFrame, expected_cols: list):
     Returns:
         The missing and extra columns, as comma-separated strings
     """
-    actual_cols = list(df.columns)
+    actual_cols = loader.header(df)
     expected_set = set(expected_cols)
     actual_set = set(actual_cols)
 
@@ -0,0 +1,486 @@
+"""
+Metrics
+"""
+import datetime
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+import sections.aggregate as aggregate
+import sections.charts as charts
+import sections.constants as constants
+import sections.dates as dates
+import sections.filters as filters
+import sections.funnel as funnel
+import sections.loader as loader
+import sections.methods as methods
+import sections.profiling as profiling
+import sections.schema as schema
+import sections.scoring as scoring
+import sections.status as status
+import sections.timeseries as timeseries
+
+# Columns the Application Data page groups on
+BREAKDOWN_DIMS = ["Industry", "Role Type", "Company Size", "Platform", "Week", "Resume ID", "Cover Letter", "Month"]
+# Finest grain of the interview cube, and the measures it carries (sum and count pairs, so means roll up)
+INTERVIEW_DIMS = ["Round", "Role Type", "Type of Interview", "Location"]
+INTERVIEW_MEASURES = {"Company": "count", "Round": "mean", "Performance": "mean", "Experience": "mean"}
+# Scoped models (ex: date ranges) kept per dataset
+MAX_SCOPED_MODELS = 8
+
+class Metrics:
+    """
+    Every number and table the pages show, derived from the three loaded sheets.
+
+    Each value is computed the first time a page asks for it and then kept, so switching
+    pages does no computation and every page reports the same numbers. A missing column
+    only breaks the values (and the page) that need it. The model is shared between
+    sessions - treat the returned frames as read-only.
+
+    A scoped model (see scoped) covers the rows of a date window and/or the filter bar.
+    """
+    def __init__(self, apps: pd.DataFrame, interviews: pd.DataFrame, roe: pd.DataFrame, timeline=None, window=None):
+        self.apps = apps
+        self.interviews = interviews
+        self.roe = roe
+        self._timeline = timeline
+        self.window = window
+
+    # ----------------------------------------------- Tracker
+    @cached_property
+    def statuses(self):
+        return status.index(self.apps)
+
+    @cached_property
+    def total_apps(self):
+        return self.apps[self.apps.columns[0]].dropna().count()
+
+    @cached_property
+    def unique_companies(self):
+        return len(pd.unique(self.apps['Company']))
+
+    # Response rate calcs (Pending is never a response, so it is left out automatically)
+    @cached_property
+    def response_number(self):
+        return self.statuses.count("All")
+
+    @cached_property
+    def real_response_number(self):
+        return self.statuses.count("Real")
+
+    @cached_property
+    def real_response_rate(self):
+        return str('{0:.4g}'.format((self.real_response_number/self.total_apps)*100)) + "%"
+
+    @cached_property
+    def currently_interviewing(self):
+        return self.statuses.count("Interviewing")
+
+    # Response time (only historical, not considering Pending)
+    @cached_property
+    def response_average(self):
+        return self.apps['Response Time (Days)'].dropna().mean()
+
+    @cached_property
+    def real_response_average(self):
+        return self.apps['Response Time (Days)'][self.statuses.mask("Real")].dropna().mean()
+
+    @cached_property
+    def longest_response(self):
+        return self.response_distribution.max
+
+    # Response times sorted once - histograms at every bin size and percentiles come from it
+    @cached_property
+    @profiling.timed("derive")
+    def response_distribution(self):
+        return charts.distribution(self.apps, 'Response Time (Days)')
+
+    @cached_property
+    def response_percentiles(self):
+        """
+        Median, 75th and 90th percentile of the response time, keyed by percentile.
+        """
+        return {q: self.response_distribution.percentile(q) for q in [50, 75, 90]}
+
+    @cached_property
+    def longest_response_company(self):
+        return self.apps.loc[self.apps['Response Time (Days)'].dropna().idxmax(), self.apps.columns[0]]
+
+    # Applications that got a response, for the response time histogram
+    @cached_property
+    @profiling.timed("derive")
+    def responded_apps(self):
+        return self.apps.dropna(subset=['Response Time (Days)'])
+
+    @cached_property
+    def num_weeks(self):
+        return self.apps["Week"].max()
+
+    @cached_property
+    def tables(self):
+        """
+        groupby_percents tables for every column in BREAKDOWN_DIMS, computed in one pass.
+        """
+        return aggregate.tables(self.apps, BREAKDOWN_DIMS)
+
+    # Week is derived from Date at load (see dates.py), so there are no auto-filled junk weeks to drop
+    @cached_property
+    def weekly(self):
+        return self.tables["Week"]
+
+    # Applications in the 28 days up to the latest application (in the window)
+    @cached_property
+    def last_four_weeks(self):
+        end = min(self.date_range[1], pd.Timestamp(self.timeline.app_rows.days[-1]).date())
+        return self.timeline.total("applications", end - datetime.timedelta(days=27), end)
+
+    # ----------------------------------------------- Time series
+    @cached_property
+    def timeline(self):
+        if self._timeline is not None:
+            return self._timeline
+        return timeseries.series(self.apps, self.interviews)
+
+    @cached_property
+    def date_range(self):
+        """
+        First and last date of the model, as datetime.date - the window of a scoped model.
+        """
+        if self.window is not None:
+            return self.window
+        return pd.Timestamp(self.timeline.first).date(), pd.Timestamp(self.timeline.last).date()
+
+    @cached_property
+    def window_counts(self):
+        return self.timeline.window(*self.date_range)
+
+    def trend(self, weeks):
+        """
+        Rolling response rates over the last `weeks` weeks, at every week end of the model's dates.
+        """
+        return self.timeline.rolling(weeks, *self.date_range)
+
+    @cached_property
+    def scopes(self):
+        return ScopedModels()
+
+    @cached_property
+    @profiling.timed("aggregate")
+    def status_table(self):
+        return methods.groupby_smaller(self.apps, "Role Type", "Status", "Applications In Status", "Applications In Status")
+
+    # ----------------------------------------------- Interviews
+    @cached_property
+    def sum_interviews(self):
+        return self.interviews[self.interviews.columns[0]].dropna().count() # NOT sum of apps interview column cause duplicates
+
+    @cached_property
+    def avg_int_per_role(self):
+        return self.apps['Number of Interviews'].dropna().mean()
+
+    @cached_property
+    def interview_max(self):
+        return self.apps['Number of Interviews'].dropna().max()
+
+    @cached_property
+    def interview_max_company(self):
+        return self.apps.loc[self.apps['Number of Interviews'].dropna().idxmax(), self.apps.columns[0]]
+
+    @cached_property
+    def interview_cube(self):
+        """
+        Interviews aggregated once at the finest grain (every INTERVIEW_DIMS combination), every
+        interview table and drill-down is summed from it.
+        """
+        return aggregate.cube(self.interviews, INTERVIEW_DIMS, INTERVIEW_MEASURES)
+
+    def interview_view(self, by, measures=None, where=None):
+        """
+        self.interviews.groupby(by).agg(measures), rolled up from the interview cube.
+
+        Args:
+            by: A column of INTERVIEW_DIMS, or a list of them
+            measures: Dict of column -> count or mean, default every INTERVIEW_MEASURES
+            where: Optional dict of column -> values to drill down to
+        """
+        return aggregate.from_cube(self.interview_cube, by, measures or INTERVIEW_MEASURES, where)
+
+    @cached_property
+    def funnel(self):
+        """
+        The interviews linked to their applications, and the hiring funnel they make.
+        """
+        return funnel.funnel(self.apps, self.interviews)
+
+    @cached_property
+    def funnel_table(self):
+        return self.funnel.table()
+
+    @cached_property
+    def reconciled_interviews(self):
+        """
+        Number of applications whose "Number of Interviews" matches the interviews linked to them,
+        out of the applications with either.
+        """
+        logged = self.apps['Number of Interviews'].fillna(0).to_numpy()
+        linked = self.funnel.linked_counts
+        either = (logged > 0) | (linked > 0)
+        return int(np.count_nonzero(either & (logged == linked))), int(np.count_nonzero(either))
+
+    @cached_property
+    @profiling.timed("aggregate")
+    def interview_tables(self):
+        """
+        Interview groupings, keyed by: round_detail, round, role_detail, role, location, type.
+        """
+        # Multiple agg groupbys - can't use the groupby_percents function. Rolled up from the cube, not the rows
+        return {
+            # Number of rounds
+            "round_detail": self.interview_view(['Round', 'Type of Interview', 'Location'], {
+                    'Company': 'count',
+                    'Performance': 'mean',
+                    'Experience': 'mean'
+                }).reset_index().sort_values("Round"),
+            "round": self.interview_view("Round", {
+                    'Company': 'count',
+                    'Performance': 'mean',
+                    'Experience': 'mean'
+                }).rename(columns={
+                    'Company': "Number of Interviews"
+                }).reset_index().sort_values("Round"),
+            # Type of role
+            "role_detail": self.interview_view(['Role Type', 'Type of Interview', 'Location'], {
+                    'Company': 'count',
+                    'Round': 'mean',
+                    'Performance': 'mean',
+                    'Experience': 'mean'
+                }).reset_index().sort_values("Company", ascending=False),
+            "role": self.interview_view('Role Type', {
+                    'Company': 'count',
+                    'Round': 'mean',
+                    'Performance': 'mean',
+                    'Experience': 'mean'
+                }).reset_index().sort_values("Company", ascending=False),
+            # Location
+            "location": self.interview_view('Location', {
+                    'Company': 'count'
+                }).reset_index().sort_values("Company", ascending=False),
+            # Type of interview
+            "type": self.interview_view('Type of Interview', {
+                    'Company': 'count'
+                }).reset_index().sort_values("Company", ascending=False),
+        }
+
+    @cached_property
+    @profiling.timed("aggregate")
+    def interview_days(self):
+        """
+        Interviews per day with calendar fields, for the heatmap.
+        """
+        return dates.daily_counts(schema.as_date(self.interviews['Date']))
+
+    # ----------------------------------------------- ROE Calculation
+    @cached_property
+    def roe_statuses(self):
+        return status.index(self.roe, "Application Status")
+
+    @cached_property
+    @profiling.timed("derive")
+    def roe_formatted(self):
+        return self.roe.reset_index().rename(columns={"index": "Application Number"})
+
+    @cached_property
+    def roe_status_options(self):
+        unique_statuses = list(self.roe_statuses.labels)
+        # Drop the weird zero at the end if it exists
+        if unique_statuses[len(unique_statuses)-1] == 0:
+            unique_statuses = unique_statuses[0:len(unique_statuses)-1]
+        return unique_statuses
+
+    @cached_property
+    @profiling.timed("aggregate")
+    def chance_accuracy(self):
+        """
+        Response rate where the chance of success is above 50%, and how much better that is than the
+        overall real response rate. Returned as (positive_chance, accuracy), both in %.
+        """
+        above_half = (self.roe['Chance of Success'] > 0.5).to_numpy()
+        total_above_1 = above_half.sum()
+        responses_above_1 = self.roe_statuses.count("Real", where=above_half)
+        positive_chance = (responses_above_1/total_above_1)*100
+        total_accuracy = self.real_response_number/self.total_apps
+        accuracy = (positive_chance-total_accuracy)/total_accuracy-100
+        return positive_chance, accuracy
+
+    # ----------------------------------------------- Cohort
+    @cached_property
+    def sources(self):
+        """
+        Names of the trackers in a cohort dataset, empty for a single tracker.
+        """
+        if constants.SOURCE not in self.apps.columns:
+            return []
+        return list(pd.unique(self.apps[constants.SOURCE].dropna()))
+
+    @cached_property
+    def cohort_tables(self):
+        """
+        groupby_percents tables per tracker, in the same single pass: keyed by SOURCE for the
+        totals of each tracker and by (SOURCE, column) for every column in BREAKDOWN_DIMS.
+        """
+        return aggregate.tables(self.apps, [constants.SOURCE] + [(constants.SOURCE, dim) for dim in BREAKDOWN_DIMS])
+
+    # Per-tracker interview and ROE summaries, None when the sheet came from a single tracker
+    @cached_property
+    @profiling.timed("aggregate")
+    def cohort_interviews(self):
+        if constants.SOURCE not in self.interviews.columns:
+            return None
+        return self.interviews.groupby(constants.SOURCE, observed=True).agg({
+                'Company': 'count',
+                'Round': 'max',
+                'Performance': 'mean',
+                'Experience': 'mean'
+            }).rename(columns={
+                'Company': "Number of Interviews",
+                'Round': "Longest Process (Rounds)"
+            }).reset_index().sort_values("Number of Interviews", ascending=False)
+
+    @cached_property
+    @profiling.timed("aggregate")
+    def cohort_roe(self):
+        if constants.SOURCE not in self.roe.columns:
+            return None
+        return self.roe.groupby(constants.SOURCE, observed=True).agg({
+                'Company Name': 'count',
+                'Chance of Success': 'mean',
+                'Application Effort': 'mean',
+                'ROE': 'mean'
+            }).rename(columns={
+                'Company Name': "Applications"
+            }).reset_index().sort_values("ROE", ascending=False)
+
+    # ----------------------------------------------- Validation
+    @cached_property
+    def validation(self):
+        """
+        Missing and extra columns of each sheet, as (missing, extra) comma-separated strings.
+        """
+        # The cohort source column is added by the app, never reported as extra
+        def expected(df, columns):
+            return columns + [constants.SOURCE] if constants.SOURCE in df.columns else columns
+        return {
+            "Tracker": methods.validate_columns(self.apps, expected(self.apps, constants.APPS_COLUMNS)),
+            "Interviews": methods.validate_columns(self.interviews, expected(self.interviews, constants.INTERVIEW_COLUMNS)),
+            "ROE Calculation": methods.validate_columns(self.roe, expected(self.roe, constants.ROE_COLUMNS)),
+        }
+
+class ScopedModels:
+    """
+    Scoped models of one dataset by scope (or by the weights they are scored with, see rescored),
+    least recently used dropped first.
+    """
+    def __init__(self, max_models=MAX_SCOPED_MODELS):
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Scoped models aren't kept in a snapshot (the lock can't be pickled), they come back empty
+    def __reduce__(self):
+        return (ScopedModels, (self.max_models,))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._models
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+        value = build()
+        with self._lock:
+            value = self._models.setdefault(key, value)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return value
+
+@profiling.timed("derive")
+def model(apps, interviews, roe):
+    """
+    Returns the metrics model of a dataset. It is stored with the loaded workbook, so it's
+    built once and shared by every page and session that loads the same data.
+
+    Args:
+        apps: The Tracker sheet
+        interviews: The Interviews sheet
+        roe: The ROE Calculation sheet
+    """
+    return loader.derived(apps, model_key(interviews, roe), lambda: Metrics(apps, interviews, roe))
+
+# Name of the model derived from the Tracker sheet. The model holds on to interviews and roe,
+# so their ids can't be reused while it is cached
+def model_key(interviews, roe):
+    return ("metrics", id(interviews), id(roe))
+
+def rescored(model, weights):
+    """
+    The metrics model of the same applications with the ROE sheet scored from other weights
+    (see scoring.roe_sheet). The last few are kept with the model like its scoped models, so
+    every set of weights is only scored once.
+
+    Args:
+        model: The model of a dataset or a scope
+        weights: scoring.Weights
+    """
+    key = ("weights", weights)
+    new = key not in model.scopes
+    value = model.scopes.get(key, lambda: Metrics(model.apps, model.interviews, scoring.roe_sheet(model.apps, weights),
+                                                  timeline=model._timeline, window=model.window))
+    if new: # Rescored models count toward the memory limit of the cache
+        loader.measure(model.apps)
+    return value
+
+# Rows of a sheet in a scope: the date rows (None for every row) that the filter mask (None for no filter) keeps
+def scope_rows(date_rows, mask, length):
+    if mask is None:
+        return date_rows if date_rows is not None else np.arange(length)
+    if date_rows is None:
+        return np.flatnonzero(mask)
+    return date_rows[mask[date_rows]]
+
+@profiling.timed("derive")
+def scoped(model, start=None, end=None, picked=None):
+    """
+    The metrics model of the applications dated from start to end (included) that match the
+    filter bar, with the interviews held in that range that match the filters on their columns.
+    ROE rows go with their application when the ROE sheet has one row per application. Rows are
+    found from the time series and the filter bitmaps, without scanning the sheets.
+
+    Args:
+        model: The model of the whole dataset
+        start, end: datetime.date, or None for every date
+        picked: Dict of column -> values picked in the filter bar
+    """
+    picked = picked or {}
+    window = (start, end) if start is not None else None
+    def build():
+        timeline = model.timeline if window is not None else None
+        rows = scope_rows(timeline.app_rows.between(start, end) if window else None,
+                          filters.index(model.apps).mask(picked), len(model.apps))
+        interview_dates = timeline.interview_rows if window and timeline.interview_rows is not None else None
+        interview_rows = scope_rows(interview_dates.between(start, end) if interview_dates is not None else None,
+                                    filters.index(model.interviews).mask(picked), len(model.interviews))
+        roe = model.roe.iloc[rows] if len(model.roe) == len(model.apps) else model.roe
+        # Filtered rows get their own time series, a date window alone shares the dataset's
+        shared = timeline if not filters.key(picked) else None
+        return Metrics(model.apps.iloc[rows], model.interviews.iloc[interview_rows], roe, timeline=shared, window=window)
+    key = (window, filters.key(picked))
+    new = key not in model.scopes
+    value = model.scopes.get(key, build)
+    if new: # Scoped models count toward the memory limit of the cache
+        loader.measure(model.apps)
+    return value
@@ -0,0 +1,217 @@
+"""
+Profiling
+
+Opt-in timing and memory instrumentation. Turn it on with ?profile=1 in the app URL
+(or TRACKER_PROFILE=1 in the environment) to get a sidebar panel with the time of each
+stage of the run (load, derive, aggregate, chart-build, render), the size of the loaded
+DataFrames, and a trace file for chrome://tracing or ui.perfetto.dev.
+
+Peak memory per stage needs tracemalloc, which is process-wide and slows down every session
+while it runs. It's only traced when the server is started with TRACKER_PROFILE=1, and for one
+run at a time: other runs profiled meanwhile report times only.
+
+When profiling is off every hook is a single thread-local lookup.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+
+# Streamlit runs every session's script in its own thread, so each run gets its own profiler
+_local = threading.local()
+_disabled = contextlib.nullcontext()
+# Held by the run whose memory is traced
+_tracing = threading.Lock()
+
+class Profiler:
+    """
+    Records nested stages of one run: wall time, traced memory high-water mark (when memory is
+    traced), and DataFrame sizes.
+    """
+    def __init__(self, memory=False):
+        self.origin = time.perf_counter()
+        self.stages = []
+        self.frames = []
+        self._stack = []
+        # Only one run at a time traces memory, peaks are process-wide
+        self.memory = memory and _tracing.acquire(blocking=False)
+        self._release = weakref.finalize(self, release, not tracemalloc.is_tracing()) if self.memory else None
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, kind, name=None):
+        record = {
+            "kind": kind,
+            "name": name or kind,
+            "depth": len(self._stack),
+            "start": time.perf_counter() - self.origin,
+            "peak": 0 if self.memory else None,
+            "children": 0.0,
+        }
+        if self.memory:
+            # Fold the parent's peak so far in before resetting the peak for this stage
+            if self._stack:
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1] - parent["memory"])
+            record["memory"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._stack.append(record)
+        try:
+            yield record
+        finally:
+            self._stack.pop()
+            record["duration"] = time.perf_counter() - self.origin - record["start"]
+            if self.memory:
+                record["peak"] = max(record["peak"], tracemalloc.get_traced_memory()[1] - record["memory"])
+            if self._stack:
+                parent = self._stack[-1]
+                parent["children"] += record["duration"]
+                if self.memory:
+                    parent["peak"] = max(parent["peak"], record["peak"] + record["memory"] - parent["memory"])
+            if self.memory:
+                tracemalloc.reset_peak()
+            self.stages.append(record)
+
+    def frame(self, name, df):
+        self.frames.append({
+            "frame": name,
+            "rows": len(df),
+            "columns": len(df.columns),
+            "memory_mb": df.memory_usage(deep=True).sum() / 1e6,
+        })
+
+    def finish(self):
+        if self._release is not None:
+            self._release()
+
+    def summary(self):
+        """
+        One row per stage, in start order: kind, name, total and self time in ms, and peak memory in MB.
+        """
+        return [{
+            "stage": "  " * s["depth"] + s["name"],
+            "kind": s["kind"],
+            "ms": s["duration"] * 1000,
+            "self_ms": (s["duration"] - s["children"]) * 1000,
+            "peak_mb": s["peak"] / 1e6 if s["peak"] is not None else None,
+        } for s in sorted(self.stages, key=lambda s: s["start"])]
+
+    def trace(self):
+        """
+        The run in Chrome trace event format.
+        """
+        events = [{
+            "name": s["name"],
+            "cat": s["kind"],
+            "ph": "X",
+            "ts": s["start"] * 1e6,
+            "dur": s["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"peak_mb": s["peak"] / 1e6 if s["peak"] is not None else None},
+        } for s in self.stages]
+        return json.dumps({"traceEvents": events, "frames": self.frames}, indent=1)
+
+# ---------------------------------------- FUNCTIONS
+
+def enabled_by_env():
+    return os.environ.get("TRACKER_PROFILE", "") not in ("", "0")
+
+# Ends the memory tracing of a run. Also runs if the run never finished (ex: interrupted by a rerun)
+def release(stop):
+    if stop:
+        tracemalloc.stop()
+    _tracing.release()
+
+def start(enabled, memory=False):
+    """
+    Starts profiling the current run if enabled, otherwise makes sure every hook is a no-op.
+
+    Args:
+        enabled: Time the stages of the run
+        memory: Also trace their peak memory, when no other run is
+    """
+    previous = getattr(_local, "profiler", None)
+    if previous is not None:
+        previous.finish()
+    _local.profiler = Profiler(memory) if enabled else None
+    return _local.profiler
+
+def finish():
+    """
+    Stops profiling the current run and returns its profiler (None if profiling was off).
+    """
+    profiler = getattr(_local, "profiler", None)
+    _local.profiler = None
+    if profiler is not None:
+        profiler.finish()
+    return profiler
+
+def stage(kind, name=None):
+    """
+    Context manager timing a stage of the current run.
+
+    Args:
+        kind: One of load, derive, aggregate, chart-build, render
+        name: What is being done, defaults to kind
+    """
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        return _disabled
+    return profiler.stage(kind, name)
+
+def timed(kind):
+    """
+    Decorator timing every call of a function as a stage, named after the function.
+    """
+    def decorator(fn):
+        name = fn.__qualname__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = getattr(_local, "profiler", None)
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with profiler.stage(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Records the size of a DataFrame in the current run
+def frame(name, df):
+    profiler = getattr(_local, "profiler", None)
+    if profiler is not None and df is not None:
+        profiler.frame(name, df)
+
+def altair_chart(chart, **kwargs):
+    """
+    st.altair_chart, timed as a chart-build stage (serializing the spec and its data).
+    """
+    import streamlit as st
+    with stage("chart-build", "altair_chart"):
+        return st.altair_chart(chart, **kwargs)
+
+def panel(profiler):
+    """
+    Shows a profiler's results in the sidebar, with a download of the trace file.
+    """
+    import pandas as pd
+    import streamlit as st
+    if profiler is None:
+        return
+    with st.sidebar.expander("Profiling", expanded=True):
+        summary = pd.DataFrame(profiler.summary())
+        # Self time, so nested stages aren't counted twice
+        totals = summary.groupby("kind")["self_ms"].sum()
+        st.text(" | ".join(f"{kind}: {ms:.0f} ms" for kind, ms in totals.items()))
+        if not profiler.memory:
+            summary = summary.drop(columns="peak_mb")
+            st.caption("Peak memory is only traced when the server runs with TRACKER_PROFILE=1, for one run at a time.")
+        st.dataframe(summary.round(2), hide_index=True)
+        if profiler.frames:
+            st.dataframe(pd.DataFrame(profiler.frames).round(3), hide_index=True)
+        st.download_button("Download trace", profiler.trace(), file_name="profile_trace.json", mime="application/json")
@@ -0,0 +1,180 @@
+"""
+Report
+
+Headless batch analysis - runs the computations behind every page for a folder of
+trackers without Streamlit, and writes the metrics and tables to disk.
+
+To run from command line: python -m sections.report <trackers folder> <output folder>
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import sections.loader as loader
+import sections.metrics as metrics
+import sections.scoring as scoring
+
+# Scalar metrics exported for every tracker
+SCALARS = [
+    "total_apps",
+    "unique_companies",
+    "response_number",
+    "real_response_number",
+    "real_response_rate",
+    "currently_interviewing",
+    "response_average",
+    "real_response_average",
+    "longest_response",
+    "longest_response_company",
+    "num_weeks",
+    "last_four_weeks",
+    "sum_interviews",
+    "avg_int_per_role",
+    "interview_max",
+    "interview_max_company",
+    "chance_accuracy",
+]
+
+FORMATS = ["json", "parquet"]
+
+# ---------------------------------------- FUNCTIONS
+
+# Plain Python values for JSON (numpy scalars, tuples, nan -> None)
+def to_python(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (tuple, list)):
+        return [to_python(v) for v in value]
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+# Every table the pages show, by name
+def model_tables(model):
+    yield "status", lambda: model.status_table
+    yield "weekly", lambda: model.weekly
+    for dim in metrics.BREAKDOWN_DIMS:
+        yield "by_" + dim.lower().replace(" ", "_"), lambda dim=dim: model.tables[dim]
+    for name in ["round_detail", "round", "role_detail", "role", "location", "type"]:
+        yield "interviews_" + name, lambda name=name: model.interview_tables[name]
+    yield "interview_days", lambda: model.interview_days
+
+def write_table(df, path, fmt):
+    if fmt == "parquet":
+        df.to_parquet(path + ".parquet", index=False)
+    else:
+        df.to_json(path + ".json", orient="records", date_format="iso")
+
+def analyze(path, out_dir, fmt="json"):
+    """
+    Computes every metric and table of one tracker and writes them to out_dir/<tracker name>/.
+    A metric that can't be computed (ex: a missing column) is recorded as an error instead
+    of failing the whole tracker.
+
+    Args:
+        path: Path to the tracker workbook
+        out_dir: Folder to write into
+        fmt: "json" or "parquet" for the tables
+    Returns:
+        A dict with the tracker name, its scalar metrics and any errors
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    summary = {"tracker": name, "errors": {}}
+    try:
+        _, sheets = loader.load_workbook(path)
+    except Exception as e:
+        summary["errors"]["load"] = repr(e)
+        return summary
+    if sheets.get("Tracker") is None:
+        summary["errors"]["load"] = "Sheet called 'Tracker' not found"
+        return summary
+    # Scored like the app: a ROE Calculation sheet that's missing or out of date is computed
+    # from the Tracker and Weights sheets
+    roe = sheets.get("ROE Calculation")
+    try:
+        calc = scoring.current(sheets["Tracker"], roe, sheets.get("Weights"))
+    except Exception as e:
+        calc = roe
+        summary["errors"]["roe"] = repr(e)
+    summary["roe_computed"] = calc is not roe
+    model = metrics.Metrics(sheets["Tracker"], sheets["Interviews"], calc)
+
+    tracker_dir = os.path.join(out_dir, name)
+    os.makedirs(tracker_dir, exist_ok=True)
+    for scalar in SCALARS:
+        try:
+            summary[scalar] = to_python(getattr(model, scalar))
+        except Exception as e:
+            summary[scalar] = None
+            summary["errors"][scalar] = repr(e)
+    for table, build in model_tables(model):
+        try:
+            write_table(build(), os.path.join(tracker_dir, table), fmt)
+        except Exception as e:
+            summary["errors"][table] = repr(e)
+
+    with open(os.path.join(tracker_dir, "metrics.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+# Workbooks in a folder, skipping Excel's "~$" lock files
+def find_trackers(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.endswith((".xlsx", ".xls")) and not f.startswith("~$")
+    )
+
+def run(paths, out_dir, fmt="json", workers=None):
+    """
+    Analyzes many trackers in parallel over a process pool and writes a combined summary.
+
+    Args:
+        paths: Tracker workbook paths
+        out_dir: Folder to write into, one subfolder per tracker plus summary.json
+        fmt: "json" or "parquet" for the tables
+        workers: Number of processes, defaults to the number of CPUs
+    Returns:
+        The list of per-tracker summaries, in the order of paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    work = partial(analyze, out_dir=out_dir, fmt=fmt)
+    if workers == 1 or len(paths) <= 1:
+        summaries = [work(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Chunking keeps the inter-process overhead low for small workbooks
+            chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))
+            summaries = list(pool.map(work, paths, chunksize=chunksize))
+
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summaries, f, indent=2)
+    if fmt == "parquet":
+        pd.DataFrame(summaries).drop(columns="errors").to_parquet(os.path.join(out_dir, "summary.parquet"), index=False)
+    return summaries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a folder of application trackers without the Streamlit UI.")
+    parser.add_argument("trackers", help="Folder of tracker workbooks (or a single workbook)")
+    parser.add_argument("out", help="Output folder")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="Format of the table files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+
+    paths = find_trackers(args.trackers) if os.path.isdir(args.trackers) else [args.trackers]
+    start = time.perf_counter()
+    summaries = run(paths, args.out, args.format, args.workers)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for summary in summaries if summary["errors"])
+    print(f"Analyzed {len(summaries)} trackers in {elapsed:.1f}s ({failed} with errors) -> {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
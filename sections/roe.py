@@ -1,138 +1,262 @@
 import streamlit as st
-from  streamlit_vertical_slider import vertical_slider 
 import altair as alt
+import pandas as pd
 
 # Homebrew files
+import sections.charts as charts
 import sections.constants as constants
-from sections.methods import *
+import sections.metrics as metrics
+import sections.profiling as profiling
+import sections.scoring as scoring
+import sections.sweep as sweep
 
 # Color constants
 color1 = constants.COLOR1
 color2 = constants.COLOR2
 gradient = [color1, color2]
 barcolor = "turbo"
+# Fields every ROE scatterplot encodes, besides its y value
+SCATTER_FIELDS = ["Application Number", "Company Name", "Application Status"]
+# Points kept at each end of the y axis when a large scatterplot is drawn as a density grid
+OUTLIERS = 100
+# Best configurations of a weight sweep listed on the page
+SWEEP_TOP = 10
 
-def show(apps, roe):
+def show(model, weights=None):
     st.title("ROE Calculations")
+    weights = weights or scoring.Weights()
+    # Scores computed in the app (see sections/scoring.py) follow the weights below, starting from
+    # the ones picked from a weight sweep
+    edited = weights_editor(model, tuned_weights(model) or weights)
+    weight_sweep(model, edited)
+    if edited != weights:
+        model = metrics.rescored(model, edited)
+        st.info("ℹ️ Showing scores computed with the edited weights.")
     try:
         # ----------------------------------------------- Constants
-        total_apps = apps[apps.columns[0]].dropna().count()
-        apps_nopend = apps[apps["Status"].str.contains("Pending")==False]
-        real_response_number = sum(1 for app_stat in apps_nopend["Status"].dropna() if app_stat in constants.REAL_RESP)
-        real_response_rate = str('{0:.4g}'.format((real_response_number/total_apps)*100)) + "%"
+        real_response_rate = model.real_response_rate
+        roe_statuses = model.roe_statuses
+        positive_chance, accuracy = model.chance_accuracy
 
         # ----------------------------------------------- Dataframes
-        status_df = groupby_smaller(apps, "Role Type", "Status", "Applications In Status", "Applications In Status")
+        status_df = model.status_table
 
         # ----------------------------------------------- Calculations
         # Scatterplot colored by application status
-        roe_formatted = roe.reset_index().rename(columns={"index": "Application Number"})
+        roe_formatted = model.roe_formatted
         # Get unique statuses from your data
-        unique_statuses = roe_formatted["Application Status"].unique().tolist()
-        # Drop the weird zero at the end if it exists
-        if unique_statuses[len(unique_statuses)-1] == 0:
-            unique_statuses = unique_statuses[0:len(unique_statuses)-1]
-        # Streamlit multiselect widget
-        selected_statuses = st.multiselect(
-            "Select application statuses to display:",
-            options=unique_statuses,
-            default=unique_statuses  # Show all by default
-        )
-        # Filter the data
-        filtered_data = roe_formatted[roe_formatted["Application Status"].isin(selected_statuses)]
-        # Scatterplot
-        st.subheader('Chance of Success')
-        scatter = alt.Chart(filtered_data).mark_circle(size=60).encode(
-            x=alt.X("Application Number:Q", title="Application Number"),
-            y=alt.Y("Chance of Success:Q", title="Chance of Success"),
-            color=alt.Color("Application Status:N", 
+        unique_statuses = model.roe_status_options
+
+        # Everything below depends on the status filter. As a fragment, changing the filter only
+        # re-filters and redraws these charts instead of rerunning the whole app
+        @st.fragment
+        def status_filtered():
+            # Streamlit multiselect widget
+            selected_statuses = st.multiselect(
+                "Select application statuses to display:",
+                options=unique_statuses,
+                default=unique_statuses  # Show all by default
+            )
+            # Filter the data
+            filtered_data = roe_formatted[roe_statuses.lookup(selected_statuses)]
+            # Scatterplot
+            st.subheader('Chance of Success')
+            scatterplot(filtered_data, "Chance of Success", "Chance of Success")
+            st.text("Note: The return on effort charts all index from 0. Add 1 to find the real application number.")
+
+            more1, more2 = st.columns(2, border=True, gap='medium')
+            with more1:
+                st.markdown("""
+                        **'Chance of Success' Definition**: 
+                        This is a measure of the likelihood of success, or the chance I think I have of getting an offer. High values indicate that I should be an ideal applicant to the position. Low values indicate that it might be a stretch for me to get the job. Each point is measured by estimating the effort for each: role, average salary, salary range (max - min salary), and industry.""")
+                st.text("Notes about the metric:")
+                st.html(
+                    "<ol style='padding-left: 5%'>" \
+                        "<li>Roles that have an exact '0.5' chance of success did not have a salary listed on the job posting.</li>" \
+                        "<li>The salary range is a confidence score. When companies have narrow salary ranges (IE 80-90k has a 10k range) the company likely has a set expectation for the role. If the range is extremely high (IE $100k or more) then the role seems ambiguous and it's not clear how the company is hiring or what a realistic salary is, and they may even be hiring for multiple levels of experience.</li>" \
+                    "</ol>"
+                )
+
+                st.metric("Real response rate (excluding auto-denials):", real_response_rate)
+                st.metric("Response rate where the chance of success is above 50%:", 
+                        f"{positive_chance:.2f}%")
+                st.metric("Accuracy of the chance of success metric:", 
+                        f"{accuracy:.2f}%")
+                st.text("This means that applications with more than a 50% chance of success are " + f"{(accuracy * 2/100):.2f}X" + " more likely to result in a response than applications below 50% chance.")
+            with more2:
+                # Status total
+                st.text("Applications by status:")
+                status_chart = alt.Chart(status_df).mark_bar().encode(
+                    x=alt.X("Status:O", title="Status", sort=None),
+                    y=alt.Y("Applications In Status:Q", title="# In Status"),
+                    color=alt.Color("Status:N", 
                             title="Status",
-                            scale=alt.Scale(scheme=barcolor)),
-            tooltip=["Application Number", "Company Name", "Application Status", "Chance of Success"]
-        )
-        # Display
-        scatterplot = st.altair_chart(scatter, use_container_width=True)
-        st.text("Note: The return on effort charts all index from 0. Add 1 to find the real application number.")
+                            scale=alt.Scale(scheme=barcolor))
+                )
+                profiling.altair_chart(status_chart, use_container_width=True)
+                st.text("Application statuses are defined in the Glossary.")
 
-        more1, more2 = st.columns(2, border=True, gap='medium')
-        with more1:
+            # Scatterplot
+            st.html("<hr>")
+            st.subheader('Application Effort')
+            scatterplot(filtered_data, "Application Effort", "Application Effort")
             st.markdown("""
-                    **'Chance of Success' Definition**: 
-                    This is a measure of the likelihood of success, or the chance I think I have of getting an offer. High values indicate that I should be an ideal applicant to the position. Low values indicate that it might be a stretch for me to get the job. Each point is measured by estimating the effort for each: role, average salary, salary range (max - min salary), and industry.""")
-            st.text("Notes about the metric:")
+                    **'Effort' Definition**: 
+                    This is a measure of how much effort has been put into an application. High values indicate that a lot of effort has been put into an application and low values indicate low levels of effort was put in.  Each point is measured by estimating the effort for each: platform and number of interviews.""")
+            st.text("Notes about the data:")
             st.html(
-                "<ol style='padding-left: 5%'>" \
-                    "<li>Roles that have an exact '0.5' chance of success did not have a salary listed on the job posting.</li>" \
-                    "<li>The salary range is a confidence score. When companies have narrow salary ranges (IE 80-90k has a 10k range) the company likely has a set expectation for the role. If the range is extremely high (IE $100k or more) then the role seems ambiguous and it's not clear how the company is hiring or what a realistic salary is, and they may even be hiring for multiple levels of experience.</li>" \
-                "</ol>"
+                    "<ol style='padding-left: 5%'>" \
+                    "<li>Each interview linearly increases the effort.</li>" \
+                    "<li>Platforms with 'easy apply' are rated more 'easy' than platforms that need fresh information with each application.</li>" \
+                    "</ol>"
             )
 
-            total_above_1 = (roe['Chance of Success'] > 0.5).sum()
-            responses_above_1 = ((roe['Chance of Success'] > 0.5) & 
-                                (roe['Application Status'].isin(['Rejected', 'Bailed', 'Interviewing', 'Ghosted', 'On Hold']))).sum()
-            positive_chance = (responses_above_1/total_above_1)*100
-            total_accuracy = real_response_number/total_apps
-            accuracy = (positive_chance-total_accuracy)/total_accuracy-100
-            st.metric("Real response rate (excluding auto-denials):", real_response_rate)
-            st.metric("Response rate where the chance of success is above 50%:", 
-                    f"{positive_chance:.2f}%")
-            st.metric("Accuracy of the chance of success metric:", 
-                    f"{accuracy:.2f}%")
-            st.text("This means that applications with more than a 50% chance of success are " + f"{(accuracy * 2/100):.2f}X" + " more likely to result in a response than applications below 50% chance.")
-        with more2:
-            # Status total
-            st.text("Applications by status:")
-            status = alt.Chart(status_df).mark_bar().encode(
-                x=alt.X("Status:O", title="Status", sort=None),
-                y=alt.Y("Applications In Status:Q", title="# In Status"),
-                color=alt.Color("Status:N", 
-                        title="Status",
-                        scale=alt.Scale(scheme=barcolor))
-            )
-            st.altair_chart(status, use_container_width=True)
-            st.text("Application statuses are defined in the Glossary.")
-
-        # Scatterplot
-        st.html("<hr>")
-        st.subheader('Application Effort')
-        effort_plot = alt.Chart(filtered_data).mark_circle(size=60).encode(
-            x=alt.X("Application Number:Q", title="Application Number"),
-            y=alt.Y("Application Effort:Q", title="Application Effort"),
-            color=alt.Color("Application Status:N", 
-                            title="Status",
-                            scale=alt.Scale(scheme=barcolor)),
-            tooltip=["Application Number", "Company Name", "Application Status", "Application Effort"]
-        )
-        # Display
-        effort_scatterplot = st.altair_chart(effort_plot, use_container_width=True)
-        st.markdown("""
-                **'Effort' Definition**: 
-                This is a measure of how much effort has been put into an application. High values indicate that a lot of effort has been put into an application and low values indicate low levels of effort was put in.  Each point is measured by estimating the effort for each: platform and number of interviews.""")
-        st.text("Notes about the data:")
-        st.html(
-                "<ol style='padding-left: 5%'>" \
-                "<li>Each interview linearly increases the effort.</li>" \
-                "<li>Platforms with 'easy apply' are rated more 'easy' than platforms that need fresh information with each application.</li>" \
-                "</ol>"
-        )
+            # Scatterplot
+            st.html("<hr>")
+            st.subheader('Return on Effort')
+            scatterplot(filtered_data, "ROE", "Return on Effort")
+            st.markdown("""
+                    **'Return on Effort' Definition**: 
+                    The return on investment, or in this case, return on effort (ROE). For example, if the ROE is 3, there would be a 3X return on the effort that I put into the application. Return on effort is qualitative and doesn't exactly capture the experience of an application. For example, getting an interview from an application does more than just reward effort - it signifies that something was right in the application (like resume, cover letter, experience, etc.) and validates the direction of future applications.""")
 
-        # Scatterplot
-        st.html("<hr>")
-        st.subheader('Return on Effort')
-        roe_plot = alt.Chart(filtered_data).mark_circle(size=60).encode(
-            x=alt.X("Application Number:Q", title="Application Number"),
-            y=alt.Y("ROE:Q", title="Return on Effort"),
-            color=alt.Color("Application Status:N", 
-                            title="Status",
-                            scale=alt.Scale(scheme=barcolor)),
-            tooltip=["Application Number", "Company Name", "Application Status", "ROE"]
-        )
-        # Display
-        roe_scatterplot = st.altair_chart(roe_plot, use_container_width=True)
-        st.markdown("""
-                **'Return on Effort' Definition**: 
-                The return on investment, or in this case, return on effort (ROE). For example, if the ROE is 3, there would be a 3X return on the effort that I put into the application. Return on effort is qualitative and doesn't exactly capture the experience of an application. For example, getting an interview from an application does more than just reward effort - it signifies that something was right in the application (like resume, cover letter, experience, etc.) and validates the direction of future applications.""")
+        status_filtered()
+
+        # Cohort info
+        if model.cohort_roe is not None:
+            st.html("<hr>")
+            st.subheader("Averages by Tracker")
+            st.dataframe(model.cohort_roe, hide_index=True)
 
 
     except:
-        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
\ No newline at end of file
+        st.write("Something went wrong, check to make sure all columns are labeled correctly.")
+
+def weights_editor(model, weights):
+    """
+    Editable tables of the scores of every industry, platform, role and status, and the effort
+    of an interview. Values of the Tracker that aren't in a table get the table's default score.
+
+    Returns:
+        The edited Weights
+    """
+    tables = {}
+    with st.expander("Scoring weights"):
+        st.text("Change a score to see the Chance of Success, Effort and ROE of every application recomputed with it.")
+        editors = st.columns(len(scoring.LOOKUP_COLUMNS))
+        for editor, (name, col) in zip(editors, scoring.LOOKUP_COLUMNS.items()):
+            scores = weights.tables.get(name, {})
+            values = list(scores)
+            if col in model.apps.columns:
+                values += [value for value in model.apps[col].dropna().astype(str).unique() if value not in scores]
+            table = pd.DataFrame({
+                name: values,
+                "Score": [scores.get(value, scoring.MISSING_SCORES[name]) for value in values],
+            })
+            with editor:
+                # Picking weights from a sweep starts the editors over
+                table = st.data_editor(table, hide_index=True, disabled=[name],
+                                       key=f"weights_{name}_{st.session_state.get('weights_version', 0)}")
+            tables[name] = {value: float(score) for value, score in zip(table[name], table["Score"]) if pd.notna(score)}
+        per_interview = st.number_input("Effort added per interview:", min_value=0.0, step=0.1,
+                                        value=float(weights.parameters["per_interview"]))
+    # Only the values the weights had, or the ones given a score other than the default, are kept
+    for name, scores in tables.items():
+        tables[name] = {value: score for value, score in scores.items()
+                        if value in weights.tables.get(name, {}) or score != scoring.MISSING_SCORES[name]}
+    return weights.replace(tables, {"per_interview": per_interview})
+
+# Weights picked from a sweep of these applications, None when none were (or they were picked for other data)
+def tuned_weights(model):
+    tuned = st.session_state.get("tuned_weights")
+    return tuned[1] if tuned is not None and tuned[0] == id(model.apps) else None
+
+@st.fragment
+def weight_sweep(model, current):
+    """
+    Scores a grid of role, industry and salary weights around the current ones against the
+    Tracker's outcomes (see sections/sweep.py) and lists the ones that best separate real
+    responses from no responses. Any of them can be picked as the weights of the page.
+
+    Args:
+        model: Metrics of the loaded workbook
+        current: The weights of the editors, the grid is built around them
+    """
+    with st.expander("Tune the weights"):
+        st.text("Try thousands of variations of the role and industry scores and the salary factor, and rank them by how well their Chance of Success separates applications that got a real response from the ones that got none.")
+        configurations = st.number_input("Configurations to try:", min_value=10, max_value=20_000, value=1000, step=100)
+        if st.button("Run sweep"):
+            feats = scoring.features(model.apps)
+            weights_grid = sweep.grid(feats, current, int(configurations))
+            with st.spinner("Scoring configurations..."):
+                st.session_state["weight_sweep"] = (id(model.apps), current, weights_grid, sweep.sweep(model.apps, weights_grid))
+        if tuned_weights(model) is not None and st.button("Back to the workbook's weights"):
+            del st.session_state["tuned_weights"]
+            st.session_state["weights_version"] = st.session_state.get("weights_version", 0) + 1
+            st.rerun()
+        # Results are kept until the sweep is run again
+        result = st.session_state.get("weight_sweep")
+        if result is None or result[0] != id(model.apps):
+            return
+        _, start, weights_grid, ranked = result
+        if start != current:
+            st.text("These results are for the weights the sweep started from - run it again to search around the current ones.")
+        base = ranked[ranked["Configuration"] == 0].iloc[0]
+        if pd.isna(base["Separation"]):
+            st.write("The Tracker needs applications with a real response and applications with none to rank weights.")
+            return
+        best = ranked.iloc[0]
+        col1, col2 = st.columns(2)
+        col1.metric("Separation of the starting weights:", f"{base['Separation']:.3f}")
+        col2.metric("Best separation found:", f"{best['Separation']:.3f}", f"{best['Separation'] - base['Separation']:+.3f}")
+        st.text("Separation is the chance that an application with a real response has a higher Chance of Success than one without: 0.5 is no better than a coin flip, 1 ranks them perfectly. Configuration 0 is the weights the sweep started from.")
+        st.dataframe(ranked.head(SWEEP_TOP).style.format({"Separation": "{:.3f}", "Response Rate Above 50%": "{:.2f}%"}), hide_index=True)
+        pick = st.selectbox("Configuration:", ranked["Configuration"].head(SWEEP_TOP).tolist())
+        picked = weights_grid.weights(pick)
+        st.metric("Separation of these weights, scored like the page does:", f"{sweep.scored_separation(model.apps, picked):.3f}")
+        st.dataframe(pd.DataFrame([(name, label, score) for name in sweep.TABLES for label, score in picked.tables[name].items()],
+                                  columns=["Table", "Value", "Score"]), hide_index=True)
+        if st.button("Use these weights"):
+            st.session_state["tuned_weights"] = (id(model.apps), picked)
+            st.session_state["weights_version"] = st.session_state.get("weights_version", 0) + 1
+            st.rerun()
+
+def scatterplot(data, field, title):
+    """
+    Scatterplot of a ROE column by application number, colored by status. Above
+    constants.SCATTER_MAX_POINTS points it is drawn as a density grid instead, with the
+    highest and lowest values still drawn as points so their tooltips work.
+
+    Args:
+        data: The (status filtered) ROE sheet with an Application Number column
+        field: Column on the y axis
+        title: Title of the y axis
+    """
+    x = alt.X("Application Number:Q", title="Application Number")
+    color = alt.Color("Application Status:N", title="Status", scale=alt.Scale(scheme=barcolor))
+    tooltip = SCATTER_FIELDS + [field]
+    if len(data) <= constants.SCATTER_MAX_POINTS:
+        chart = alt.Chart(charts.project(data, tooltip)).mark_circle(size=60).encode(
+            x=x,
+            y=alt.Y(f"{field}:Q", title=title),
+            color=color,
+            tooltip=tooltip
+        )
+        profiling.altair_chart(chart, use_container_width=True)
+        return
+
+    grid = alt.Chart(charts.density(data, "Application Number", field, "Application Status")).mark_rect().encode(
+        x=alt.X("Application Number:Q", bin=alt.Bin(binned=True), title="Application Number"),
+        x2="Application Number_end:Q",
+        y=alt.Y(f"{field}:Q", bin=alt.Bin(binned=True), title=title),
+        y2=f"{field}_end:Q",
+        color=alt.Color("count:Q", scale=alt.Scale(range=gradient), title="Applications"),
+        tooltip=[alt.Tooltip("count:Q", title="Applications"), alt.Tooltip("Application Status:N", title="Most common status")]
+    )
+    points = alt.Chart(charts.project(charts.outliers(data, field, OUTLIERS), tooltip)).mark_circle(size=60).encode(
+        x=x,
+        y=alt.Y(f"{field}:Q", title=title),
+        color=color,
+        tooltip=tooltip
+    )
+    profiling.altair_chart(alt.layer(grid, points).resolve_scale(color="independent"), use_container_width=True)
+    st.text(f"{len(data):,} applications are shown as a density grid, with the {OUTLIERS} highest and lowest as points.")
@@ -0,0 +1,104 @@
+"""
+Schema
+
+Converts loaded sheets to the compact dtypes in constants.SHEET_DTYPES. A column is only
+converted when nothing is lost: text in a number column, or a date that doesn't parse,
+leaves that column as it was (validation and the pages then report it like before).
+Converting an already converted sheet is a no-op, so it's safe on sidecars and cohorts.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+
+# ---------------------------------------- FUNCTIONS
+
+def as_category(col):
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col
+    return col.astype("category")
+
+# Numbers of a column, or None if some non-missing value isn't a number
+def as_numbers(col):
+    if pd.api.types.is_bool_dtype(col):
+        return None
+    numbers = pd.to_numeric(col, errors="coerce")
+    if numbers.isna().sum() != col.isna().sum():
+        return None
+    return numbers
+
+def as_int(col):
+    """
+    The smallest int dtype that holds the column, or float32 when values are missing or fractional.
+    """
+    numbers = as_numbers(col)
+    if numbers is None:
+        return col
+    values = numbers.to_numpy(dtype=np.float64)
+    if np.isnan(values).any() or not np.array_equal(values, np.round(values)):
+        return numbers.astype(np.float32)
+    return pd.to_numeric(numbers.astype(np.int64), downcast="integer")
+
+def as_float(col):
+    numbers = as_numbers(col)
+    if numbers is None:
+        return col
+    return numbers.astype(np.float32)
+
+def as_date(col):
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    dates = pd.to_datetime(col, errors="coerce")
+    if dates.isna().sum() != col.isna().sum():
+        return col
+    return dates
+
+CONVERTERS = {
+    "category": as_category,
+    "int": as_int,
+    "float": as_float,
+    "date": as_date,
+}
+
+def compact(df, dtypes):
+    """
+    Converts the columns of a sheet to their compact dtypes. Columns that aren't in dtypes are left alone.
+
+    Args:
+        df: A loaded sheet
+        dtypes: Dict of column -> category, int, float or date
+    Returns:
+        A new DataFrame
+    """
+    converted = {col: CONVERTERS[kind](df[col]) for col, kind in dtypes.items() if col in df.columns}
+    if constants.SOURCE in df.columns:
+        converted[constants.SOURCE] = as_category(df[constants.SOURCE])
+    return df.assign(**converted) if converted else df
+
+def compact_sheets(sheets):
+    """
+    Applies the schema of every sheet in a dict of sheet name -> DataFrame (or None).
+    """
+    return {name: compact(df, constants.SHEET_DTYPES.get(name, {})) if df is not None else None
+            for name, df in sheets.items()}
+
+def concat(frames):
+    """
+    pd.concat of frames in the compact schema. Categorical columns stay categorical (with the
+    union of the categories, sorted like astype("category") sorts them) instead of turning into
+    object columns when the frames have different categories.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    for col in frames[0].columns:
+        parts = [frame[col] for frame in frames if col in frame.columns]
+        if len(parts) < len(frames) or not all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            continue
+        categories = parts[0].cat.categories.append([part.cat.categories for part in parts[1:]]).unique()
+        try:
+            categories = categories.sort_values()
+        except TypeError: # Mixed text and numbers keep their order
+            pass
+        frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,220 @@
+"""
+Scoring
+
+The ROE model of the template's "ROE Calculation" sheet, computed in the app. Role, average
+salary, salary range and industry give the Chance of Success; platform, status and interviews
+give the Application Effort; ROE is their ratio.
+
+The lookup columns of the Tracker are encoded as integer codes once per loaded workbook. Scoring
+every application is then one table lookup per column (the score of each distinct value, indexed
+by the codes) and a few array operations - no per-row formulas, no string matching.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+import sections.loader as loader
+import sections.profiling as profiling
+import sections.schema as schema
+
+# Tracker column scored by each table of the Weights sheet
+LOOKUP_COLUMNS = {
+    "Industry": "Industry",
+    "Platform": "Platform",
+    "Role": "Role Type",
+    "Status": "Status",
+}
+# Scores of the template's Weights sheet, used when a workbook has none
+DEFAULT_TABLES = {
+    "Industry": {"Industry 1": 0.8, "Industry 2": 0.9, "Industry 3": 1.0, "Industry 4": 1.1, "Industry 5": 0.8},
+    "Platform": {"Platform 1": 0.3, "Platform 2": 0.4, "Platform 3": 0.5, "Platform 4": 0.6, "Platform 5": 0.5},
+    "Role": {"Role 1": 0.5, "Role 2": 0.6, "Role 3": 0.7, "Role 4": 0.8, "Role 5": 0.9},
+    "Status": {"Pending": 0.5, "Denied": 0.5, "Rejected": 0.5, "Interviewing": 0.5, "Ghosted": 0.5,
+               "Bailed": 0.5, "No Response": 0.5, "On Hold": 0.5, "Offer": 0.2},
+}
+# Score of values that aren't in a table (the sheet's XLOOKUP defaults)
+MISSING_SCORES = {"Industry": 0.5, "Platform": 0.2, "Role": 1.0, "Status": 0.2}
+# Constants of the sheet's formulas. Interview weight is 1 + per_interview x Number of Interviews
+# (the template keeps it at 1)
+DEFAULT_PARAMETERS = {
+    "salary_scale": 120.0,
+    "salary_spread": 0.8,
+    "salary_likeliness": 0.95,
+    "no_salary_chance": 0.5,
+    "no_platform_effort": 0.2,
+    "platform_share": 0.4,
+    "status_share": 0.3,
+    "interview_share": 0.3,
+    "per_interview": 0.0,
+}
+# Columns the sheet must have filled in on every row to be used as is
+SCORE_COLUMNS = ["Chance of Success", "Application Effort", "ROE"]
+
+class Weights:
+    """
+    The lookup tables (table -> value -> score) and formula constants of the ROE model.
+    """
+    def __init__(self, tables=None, parameters=None):
+        self.tables = {name: dict(DEFAULT_TABLES[name]) for name in LOOKUP_COLUMNS} if tables is None else tables
+        self.parameters = {**DEFAULT_PARAMETERS, **(parameters or {})}
+
+    def __eq__(self, other):
+        return isinstance(other, Weights) and self.tables == other.tables and self.parameters == other.parameters
+
+    # Weights are never changed in place (see replace), so they can key a cache
+    def __hash__(self):
+        return hash((tuple((name, tuple(sorted(scores.items()))) for name, scores in sorted(self.tables.items())),
+                     tuple(sorted(self.parameters.items()))))
+
+    def replace(self, tables=None, parameters=None):
+        """
+        A copy with some tables and/or parameters replaced.
+        """
+        return Weights({**self.tables, **(tables or {})}, {**self.parameters, **(parameters or {})})
+
+class Features:
+    """
+    What the model reads from every application, encoded once: the codes of each lookup column,
+    the average salary and the number of interviews.
+    """
+    @profiling.timed("derive")
+    def __init__(self, apps):
+        self.rows = len(apps)
+        self.codes = {}
+        self.labels = {}
+        for name, col in LOOKUP_COLUMNS.items():
+            if col in apps.columns:
+                self.codes[name], labels = pd.factorize(apps[col])
+                self.labels[name] = [str(label) for label in labels]
+            else:
+                self.codes[name], self.labels[name] = np.full(self.rows, -1), []
+        # A blank salary counts as 0, like in the sheet
+        salary = [numbers(apps, col) for col in ["Salary Min", "Salary Max"]]
+        self.salary_average = (salary[0] + salary[1]) / 2
+        self.interviews = numbers(apps, "Number of Interviews")
+
+    def __len__(self):
+        return self.rows
+
+    def lookup(self, name, scores, missing=None):
+        """
+        Score of every application in a table.
+
+        Args:
+            name: Table name (see LOOKUP_COLUMNS)
+            scores: Dict of value -> score
+            missing: Score of values not in the table, default MISSING_SCORES
+        """
+        missing = MISSING_SCORES[name] if missing is None else missing
+        # One extra slot at the end for missing values, which have code -1
+        table = np.array([scores.get(label, missing) for label in self.labels[name]] + [missing], dtype=float)
+        return table[self.codes[name]]
+
+# ---------------------------------------- FUNCTIONS
+
+# A numeric column as floats, 0 where blank or missing
+def numbers(df, col):
+    if col not in df.columns:
+        return np.zeros(len(df))
+    return np.nan_to_num(pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float))
+
+# The features of a sheet, built once per loaded workbook
+def features(apps):
+    return loader.derived(apps, "scoring", lambda: Features(apps))
+
+@profiling.timed("derive")
+def score(feats, weights=None):
+    """
+    The sheet's formulas for every application at once.
+
+    Args:
+        feats: Features of the Tracker
+        weights: Weights, default the template's
+    Returns:
+        Dict of column -> array: the factor columns of the sheet, Chance of Success,
+        Application Effort and ROE
+    """
+    weights = Weights() if weights is None else weights
+    p = weights.parameters
+    role = feats.lookup("Role", weights.tables.get("Role", {}))
+    industry = feats.lookup("Industry", weights.tables.get("Industry", {}))
+    status_effort = feats.lookup("Status", weights.tables.get("Status", {}))
+    platform = feats.lookup("Platform", weights.tables.get("Platform", {}))
+    interview_weight = 1 + p["per_interview"] * feats.interviews
+    average = feats.salary_average
+
+    chance = np.where(average == 0, p["no_salary_chance"],
+                      np.clip(p["salary_spread"] * role * p["salary_likeliness"] * industry * (average / p["salary_scale"]), 0, 1))
+    effort = np.where(platform == 0, p["no_platform_effort"],
+                      p["platform_share"] * platform + p["status_share"] * status_effort + p["interview_share"] * interview_weight)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roe = chance / effort
+    return {
+        "Salary Average (Min+Max/2)": average,
+        "Role Likeliness": role,
+        "Industry Likeliness": industry,
+        "Status Effort": status_effort,
+        "Platform Effort": platform,
+        "Interview Weight": interview_weight,
+        "Chance of Success": chance,
+        "Application Effort": effort,
+        "ROE": roe,
+    }
+
+def roe_sheet(apps, weights=None):
+    """
+    The ROE Calculation sheet computed from the Tracker: one row per application, in order,
+    with the columns the pages read (constants.ROE_COLUMNS, and the Source of a cohort).
+    """
+    scores = score(features(apps), weights)
+    # .array keeps categorical columns categorical, so they aren't encoded again
+    columns = {
+        "Company Name": apps[apps.columns[0]].array,
+        "Application Status": apps["Status"].array if "Status" in apps.columns else np.full(len(apps), None),
+        **{col: scores[col] for col in SCORE_COLUMNS},
+    }
+    if constants.SOURCE in apps.columns:
+        columns[constants.SOURCE] = apps[constants.SOURCE].array
+    sheet = schema.compact(pd.DataFrame(columns), constants.ROE_DTYPES)
+    sheet.attrs["header"] = list(sheet.columns)
+    return sheet
+
+def stale(apps, roe):
+    """
+    True when the ROE Calculation sheet doesn't score the Tracker as it is now: it's missing,
+    wasn't filled down to every application, or has blank scores (ex: formulas never calculated).
+    """
+    if roe is None or len(roe) != len(apps) or any(col not in roe.columns for col in SCORE_COLUMNS):
+        return True
+    if roe[SCORE_COLUMNS].isna().to_numpy().any():
+        return True
+    # The sheet follows the Tracker row by row
+    if "Company Name" in roe.columns:
+        return not np.array_equal(roe["Company Name"].astype(str).to_numpy(), apps[apps.columns[0]].astype(str).to_numpy())
+    return False
+
+def read_weights(sheet):
+    """
+    Weights from a workbook's Weights sheet: side by side pairs of a value column named after the
+    table (Industry, Platform, Role, Status) and its Score column. Tables the sheet doesn't have
+    keep the template's scores.
+    """
+    if sheet is None:
+        return Weights()
+    tables = {}
+    columns = list(sheet.columns)
+    for name, scores in zip(columns, columns[1:]):
+        if name in LOOKUP_COLUMNS and str(scores).startswith("Score"):
+            pairs = sheet[[name, scores]].dropna()
+            # Rounded back from the float32 the scores are loaded as
+            tables[name] = {str(label): round(float(value), 6) for label, value in zip(pairs[name], pd.to_numeric(pairs[scores], errors="coerce")) if not np.isnan(value)}
+    return Weights().replace(tables)
+
+def current(apps, roe, weights_sheet=None):
+    """
+    The ROE Calculation sheet to show: the workbook's when it's up to date, else computed from the
+    Tracker with the workbook's weights. Built once per loaded workbook.
+    """
+    def build():
+        return roe_sheet(apps, read_weights(weights_sheet)) if stale(apps, roe) else roe
+    return loader.derived(apps, ("roe", id(roe), id(weights_sheet)), build)
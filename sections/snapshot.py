@@ -0,0 +1,142 @@
+"""
+Snapshot
+
+Most visitors only ever see the bundled example workbook. A build step parses it once, computes
+every metric and table the pages show, and pickles the result next to the workbook. The app
+loads that snapshot once per process and installs it into the loader's cache, so the example
+data is served to every session without opening Excel or running a groupby.
+
+A snapshot is only used when it was built from the same workbook bytes by the same code,
+otherwise the app loads the workbook like any other.
+
+To build from command line: python -m sections.snapshot [workbook] [snapshot]
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from functools import cached_property
+
+import sections.filters as filters
+import sections.loader as loader
+import sections.metrics as metrics
+
+DEFAULT_FILE = "excel/example_app_tracker.xlsx"
+SNAPSHOT_FILE = "excel/example_app_tracker.snapshot"
+
+_loaded = {}
+_lock = threading.Lock()
+
+# ---------------------------------------- FUNCTIONS
+
+def code_version():
+    """
+    Hash of the app's source files - a snapshot built by other code is stale.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".py"):
+            with open(os.path.join(folder, name), "rb") as f:
+                digest.update(name.encode() + f.read())
+    return digest.hexdigest()
+
+def warm(model):
+    """
+    Computes every value of a metrics model (and the filter indexes) so they're kept
+    with the loaded workbook. Values that can't be computed are left for the page to report.
+    """
+    for name, value in vars(metrics.Metrics).items():
+        if isinstance(value, cached_property):
+            try:
+                getattr(model, name)
+            except Exception:
+                pass
+    for sheet in [model.apps, model.interviews]:
+        filters.index(sheet)
+
+def build(source=DEFAULT_FILE, path=SNAPSHOT_FILE):
+    """
+    Parses a workbook, computes everything the pages show, and writes the snapshot.
+
+    Args:
+        source: Path to the workbook
+        path: Path of the snapshot file
+    Returns:
+        The size of the snapshot in bytes
+    """
+    key, sheets = loader.load_workbook(source)
+    warm(metrics.model(sheets["Tracker"], sheets["Interviews"], sheets["ROE Calculation"]))
+    with open(source, "rb") as f:
+        digest = loader.bytes_key(f.read())
+    snapshot = {
+        "workbook": digest,
+        "code": code_version(),
+        "sheets": sheets,
+        "derived": loader.derived_objects(key),
+    }
+    # Written under a temporary name and renamed, so the app never reads half a snapshot
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+def read(source, path):
+    """
+    The snapshot of a workbook, or None when there is none or it's stale. Only built by this
+    module from the bundled workbook - never point it at an uploaded file.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        with open(source, "rb") as f:
+            digest = loader.bytes_key(f.read())
+    except Exception: # Unreadable, or written by other library versions
+        return None
+    if snapshot.get("workbook") != digest or snapshot.get("code") != code_version():
+        return None
+    derived = {}
+    for (sheet, name), value in snapshot["derived"].items():
+        # The model is named after the ids of its sheets, which are new objects after unpickling
+        if isinstance(value, metrics.Metrics):
+            name = metrics.model_key(value.interviews, value.roe)
+        # So are the time series and funnel, named after their Interviews sheet
+        elif isinstance(name, tuple) and name[0] in ("timeseries", "funnel"):
+            name = (name[0], id(value.interviews))
+        derived[(sheet, name)] = value
+    snapshot["derived"] = derived
+    return snapshot
+
+def install(source=DEFAULT_FILE, path=SNAPSHOT_FILE):
+    """
+    Makes loader.load_workbook(source) serve the snapshot. The snapshot file is read once per
+    process and installed again if the cache evicted it. Cheap to call on every rerun.
+
+    Returns:
+        True if the snapshot is used
+    """
+    with _lock:
+        if path not in _loaded:
+            _loaded[path] = read(source, path)
+    snapshot = _loaded[path]
+    if snapshot is None:
+        return False
+    loader.install(loader.path_key(source), snapshot["sheets"], snapshot["derived"])
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the pages of the bundled example workbook.")
+    parser.add_argument("workbook", nargs="?", default=DEFAULT_FILE, help="Workbook to snapshot")
+    parser.add_argument("snapshot", nargs="?", default=SNAPSHOT_FILE, help="Snapshot file to write")
+    args = parser.parse_args(argv)
+    size = build(args.workbook, args.snapshot)
+    print(f"Wrote {args.snapshot} ({size / 1024:.0f} KB)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Status
+"""
+import numpy as np
+import pandas as pd
+
+import sections.constants as constants
+import sections.loader as loader
+import sections.profiling as profiling
+
+class StatusIndex:
+    """
+    A status column encoded once as integer codes, with a precomputed boolean mask per status group.
+
+    Groups are classified on the distinct status labels, never on the rows, and the row masks
+    are a single lookup by code. New taxonomies can be added without rescanning the strings.
+    """
+    @profiling.timed("derive")
+    def __init__(self, status: pd.Series, groups=None):
+        self.codes, labels = pd.factorize(status)
+        self.labels = list(labels)
+        self.masks = {}
+        self.add_groups(constants.STATUS_GROUPS if groups is None else groups)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, statuses):
+        """
+        Row mask for a set of statuses.
+
+        Args:
+            statuses: A list of status labels, or a function that takes a label and returns a bool
+        """
+        member = statuses if callable(statuses) else set(statuses).__contains__
+        # One extra False slot at the end for missing statuses, which have code -1
+        table = np.zeros(len(self.labels) + 1, dtype=bool)
+        table[:-1] = [isinstance(label, str) and member(label) for label in self.labels]
+        return table[self.codes]
+
+    def add_groups(self, groups):
+        for name, statuses in groups.items():
+            self.masks[name] = self.lookup(statuses)
+
+    def with_groups(self, groups):
+        """
+        Returns a copy of the index classified with a different status taxonomy. The codes are shared.
+        """
+        other = StatusIndex.__new__(StatusIndex)
+        other.codes = self.codes
+        other.labels = self.labels
+        other.masks = {}
+        other.add_groups(groups)
+        return other
+
+    def mask(self, name):
+        return self.masks[name]
+
+    def count(self, name, where=None):
+        """
+        Number of rows in a status group, optionally only counting rows where the mask `where` is True.
+        """
+        mask = self.masks[name]
+        if where is not None:
+            mask = mask & where
+        return int(np.count_nonzero(mask))
+
+    def counts(self):
+        """
+        Number of rows per status label, as a Series in order of first appearance.
+        """
+        valid = self.codes >= 0
+        return pd.Series(np.bincount(self.codes[valid], minlength=len(self.labels)), index=self.labels)
+
+# Returns the status index of a sheet, built once per loaded workbook
+def index(sheet, col="Status"):
+    return loader.derived(sheet, ("status", col), lambda: StatusIndex(sheet[col]))
@@ -0,0 +1,269 @@
+"""
+Sweep
+
+What-if evaluation of Chance of Success weights: thousands of configurations of the role and
+industry scores (and the overall salary factor) scored against the Tracker's outcomes at once,
+ranked by how well each one separates real responses from applications that got no response.
+
+A block of configurations is scored as one configurations x applications matrix by broadcasting
+each configuration's score tables over the encoded columns (see scoring.Features). Separation is
+the AUC: the chance that a real response scores higher than a non-response (ties count half),
+counted on scores binned to BINS levels. Large trackers count it from per-configuration
+histograms instead of sorting every row, small ones (where a histogram would be mostly empty
+bins) by sorting. Large grids are split into blocks that run on a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import sections.profiling as profiling
+import sections.scoring as scoring
+import sections.status as status
+
+# Factors the base scores are multiplied by to make the configurations of a grid
+LEVELS = [0.5, 0.75, 1.0, 1.25, 1.5]
+# Tables and parameters a configuration changes
+TABLES = ["Role", "Industry"]
+# Scores are binned to this resolution (~1.5e-5) to count the pairs they order
+BINS = 65_536
+# Configurations x applications (or bins, when there are fewer applications and histograms are
+# used) scored at once. Memory per block is ~40 bytes per cell
+BLOCK_CELLS = 4_000_000
+# Smaller grids run in-process, where starting a pool costs more than it saves
+PARALLEL_CELLS = 50_000_000
+
+# Arrays every block of a sweep reads - set once per worker process (see init)
+_shared = {}
+
+class Grid:
+    """
+    Configurations of the Chance of Success weights as arrays, one row per configuration.
+
+    Attributes:
+        labels: Dict of table -> the values of the Tracker, in the order of the columns of scores
+        scores: Dict of table -> configurations x values array of scores, with one extra last
+            column for values the table doesn't have (and missing values)
+        factor: Overall salary factor of every configuration (salary spread x salary likeliness
+            / salary scale in the sheet's formula)
+    """
+    def __init__(self, labels, scores, factor, base):
+        self.labels = labels
+        self.scores = scores
+        self.factor = factor
+        self.base = base
+
+    def __len__(self):
+        return len(self.factor)
+
+    def weights(self, i):
+        """
+        Configuration i as Weights. The salary factor is carried by the salary likeliness.
+        """
+        tables = {name: dict(zip(self.labels[name], self.scores[name][i, :-1].tolist())) for name in self.scores}
+        p = self.base.parameters
+        likeliness = self.factor[i] * p["salary_scale"] / p["salary_spread"]
+        return self.base.replace(tables, {"salary_likeliness": round(float(likeliness), 6)})
+
+# ---------------------------------------- FUNCTIONS
+
+def grid(feats, base=None, configurations=1000, levels=LEVELS, seed=0):
+    """
+    A random grid around the base weights: every score of the tables in TABLES, and the salary
+    factor, multiplied by one of the levels. Configuration 0 is the base weights. The score of
+    missing values isn't swept, Weights has no place for it (see scoring.MISSING_SCORES).
+
+    Args:
+        feats: Features of the Tracker (see scoring.features)
+        base: Weights to start from, default the template's
+        configurations: Number of configurations
+        levels: Factors to pick from
+        seed: Seed of the random picks, so the same grid can be built again
+    """
+    base = scoring.Weights() if base is None else base
+    rng = np.random.default_rng(seed)
+    levels = np.asarray(levels, dtype=float)
+    labels, scores = {}, {}
+    for name in TABLES:
+        labels[name] = feats.labels[name]
+        table = base.tables.get(name, {})
+        missing = scoring.MISSING_SCORES[name]
+        start = np.array([table.get(label, missing) for label in labels[name]] + [missing], dtype=float)
+        scores[name] = start * rng.choice(levels, size=(configurations, len(start)))
+        scores[name][0] = start
+        scores[name][:, -1] = start[-1]
+    p = base.parameters
+    factor = p["salary_spread"] * p["salary_likeliness"] / p["salary_scale"] * rng.choice(levels, size=configurations)
+    factor[0] = p["salary_spread"] * p["salary_likeliness"] / p["salary_scale"]
+    return Grid(labels, scores, factor, base)
+
+def outcomes(apps):
+    """
+    Masks of the applications that got a real response (constants.REAL_RESP) and of the ones that
+    got no response at all. Automatic responses (ex: Denied) are in neither.
+    """
+    statuses = status.index(apps)
+    return statuses.mask("Real"), ~statuses.mask("All")
+
+def scored_separation(apps, weights):
+    """
+    Separation of one set of weights, scored with scoring.score rather than a grid - what a
+    configuration picked from a sweep gives once it's used.
+    """
+    positive, negative = outcomes(apps)
+    chance = scoring.score(scoring.features(apps), weights)["Chance of Success"].astype(np.float32)
+    chance = np.concatenate([chance[positive], chance[negative]])[None, :]
+    return float(separation(chance, int(np.count_nonzero(positive)), int(np.count_nonzero(negative)))[0])
+
+def check(apps, weights_grid, ranked, top=10, tolerance=1e-4):
+    """
+    Configurations among the best ranked whose weights, scored with scoring.score, don't give the
+    separation they were ranked with (empty when the grid and the weights agree).
+    """
+    return [int(i) for i, auc in zip(ranked["Configuration"].head(top), ranked["Separation"].head(top))
+            if not abs(scored_separation(apps, weights_grid.weights(i)) - auc) <= tolerance]
+
+def init(shared):
+    _shared.clear()
+    _shared.update(shared)
+
+def prepare(feats, positive, negative, no_salary_chance):
+    """
+    What every block reads, laid out for speed: the applications reordered so the real responses
+    come first and the non-responses next (the columns of a block's matrices are then slices, not
+    copies), and the codes of every table in TABLES packed into one code per application.
+    """
+    order = np.concatenate([np.flatnonzero(positive), np.flatnonzero(negative), np.flatnonzero(~positive & ~negative)])
+    combined = np.zeros(len(order), dtype=np.int64)
+    for name in TABLES:
+        # Code -1 (values a table doesn't have, missing values) becomes the table's last column
+        codes = feats.codes[name][order]
+        width = len(feats.labels[name]) + 1
+        combined = combined * width + np.where(codes < 0, width - 1, codes)
+    average = feats.salary_average[order]
+    return {
+        "average": average.astype(np.float32),
+        "combined": combined,
+        "no_salary": np.flatnonzero(average == 0),
+        "no_salary_chance": no_salary_chance,
+        "n_pos": int(np.count_nonzero(positive)),
+        "n_neg": int(np.count_nonzero(negative)),
+    }
+
+def chances(shared, scores, factor):
+    """
+    The Chance of Success of every application under every configuration of a block, as a
+    configurations x applications matrix (applications in the order of prepare).
+    """
+    # Product of the tables' scores for every combination of values, times the salary factor -
+    # small, then one gather per cell
+    table = factor[:, None]
+    for name in TABLES:
+        table = (table[:, :, None] * scores[name][:, None, :]).reshape(len(factor), -1)
+    chance = table.astype(np.float32)[:, shared["combined"]]
+    chance *= shared["average"]
+    np.minimum(chance, 1, out=chance)
+    chance[:, shared["no_salary"]] = shared["no_salary_chance"]
+    return chance
+
+# True when the AUC of n scored applications is counted from histograms, not by sorting. Sorting
+# is faster up to ~BINS / 7 applications
+def histograms(n):
+    return n >= BINS // 8
+
+def separation(chance, n_pos, n_neg):
+    """
+    AUC of every row of a score matrix whose first n_pos columns are positives and next n_neg
+    negatives: the chance that a positive scores higher than a negative, ties counted half.
+    Scores are binned to BINS levels on [0, 1], then counted from per-row histograms when there
+    are many scores, or by sorting them (see ranked_separation) - both give the same AUC.
+    """
+    rows = len(chance)
+    if not n_pos or not n_neg:
+        return np.full(rows, np.nan)
+    bins = np.minimum(chance[:, :n_pos + n_neg] * BINS, BINS - 1).astype(np.int64)
+    if not histograms(n_pos + n_neg):
+        return ranked_separation(bins, n_pos, n_neg)
+    # Each row's bins moved to their own range, and the negatives' after all the positives', so
+    # one bincount histograms both for every row
+    bins += (np.arange(rows) * BINS)[:, None]
+    bins[:, n_pos:] += rows * BINS
+    counts = np.bincount(bins.ravel(), minlength=2 * rows * BINS).reshape(2, rows, BINS)
+    pos, neg = counts[0], counts[1]
+    below = np.cumsum(neg, axis=1) - neg
+    pairs = (pos * below).sum(axis=1) + 0.5 * (pos * neg).sum(axis=1)
+    return pairs / (n_pos * n_neg)
+
+def ranked_separation(bins, n_pos, n_neg):
+    """
+    AUC of every row of a binned score matrix (see separation) by sorting each row's negatives
+    and finding where every positive falls among them.
+    """
+    rows = len(bins)
+    # Each row moved to its own range, so the rows sorted one by one are also sorted as one array
+    offset = (np.arange(rows) * BINS)[:, None]
+    negatives = (np.sort(bins[:, n_pos:], axis=1) + offset).ravel()
+    positives = bins[:, :n_pos] + offset
+    start = (np.arange(rows) * n_neg)[:, None]
+    below = np.searchsorted(negatives, positives, side="left") - start
+    tied = np.searchsorted(negatives, positives, side="right") - start - below
+    pairs = below.sum(axis=1) + 0.5 * tied.sum(axis=1)
+    return pairs / (n_pos * n_neg)
+
+def evaluate(block):
+    """
+    Scores one block of configurations. Module level so it can run in a worker process.
+
+    Args:
+        block: (scores, factor) of the block's configurations
+    Returns:
+        The AUC of every configuration, and the real response rate of the applications it gives
+        more than a 50% chance (NaN when there are none)
+    """
+    scores, factor = block
+    chance = chances(_shared, scores, factor)
+    auc = separation(chance, _shared["n_pos"], _shared["n_neg"])
+    above = chance > 0.5
+    counted = np.count_nonzero(above, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(counted > 0, np.count_nonzero(above[:, :_shared["n_pos"]], axis=1) / counted * 100, np.nan)
+    return auc, rate
+
+@profiling.timed("aggregate")
+def sweep(apps, weights_grid, workers=None):
+    """
+    Evaluates every configuration of a grid against the Tracker's outcomes.
+
+    Args:
+        apps: The Tracker sheet
+        weights_grid: Grid of configurations (see grid)
+        workers: Maximum number of processes for large grids, defaults to the number of CPUs.
+            1 never starts a pool
+    Returns:
+        DataFrame with one row per configuration, best separation first: Configuration (its row
+        in the grid), Separation (AUC, 0.5 is no better than chance) and Response Rate Above 50%
+    """
+    feats = scoring.features(apps)
+    positive, negative = outcomes(apps)
+    shared = prepare(feats, positive, negative, weights_grid.base.parameters["no_salary_chance"])
+    counted = shared["n_pos"] + shared["n_neg"]
+    size = max(1, BLOCK_CELLS // (max(len(feats), BINS) if histograms(counted) else max(len(feats), 1)))
+    blocks = [({name: scores[start:start + size] for name, scores in weights_grid.scores.items()}, weights_grid.factor[start:start + size])
+              for start in range(0, len(weights_grid), size)]
+
+    if workers != 1 and len(blocks) > 1 and len(weights_grid) * len(feats) >= PARALLEL_CELLS:
+        max_workers = min(len(blocks), workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init, initargs=(shared,)) as pool:
+            results = list(pool.map(evaluate, blocks))
+    else:
+        init(shared)
+        results = [evaluate(block) for block in blocks]
+    auc = np.concatenate([result[0] for result in results]) if results else np.array([])
+    rate = np.concatenate([result[1] for result in results]) if results else np.array([])
+    ranked = pd.DataFrame({
+        "Configuration": np.arange(len(auc)),
+        "Separation": auc,
+        "Response Rate Above 50%": rate,
+    })
+    return ranked.sort_values("Separation", ascending=False, kind="stable").reset_index(drop=True)
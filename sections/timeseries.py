@@ -0,0 +1,136 @@
+"""
+Timeseries
+
+Daily counts of a dataset kept as prefix sums over a calendar of days, built once per loaded
+workbook. The count of applications, responses, real responses or interviews between any two
+dates is then a subtraction of two array entries, and the rows in a date range are found by
+binary search on the dates sorted once - moving the date range never rescans the tracker.
+"""
+import numpy as np
+import pandas as pd
+
+import sections.loader as loader
+import sections.profiling as profiling
+import sections.status as status
+
+# Series counted per day
+SERIES = ["applications", "responses", "real_responses", "interviews"]
+DAY = np.timedelta64(1, "D")
+
+class DateRows:
+    """
+    Rows of a sheet ordered by date, for finding the rows between two dates without scanning.
+    Rows without a date are never in a range.
+    """
+    def __init__(self, dates):
+        days = to_days(dates)
+        valid = np.flatnonzero(~np.isnat(days))
+        self.order = valid[np.argsort(days[valid], kind="stable")]
+        self.days = days[self.order]
+
+    def __len__(self):
+        return len(self.order)
+
+    def between(self, start, end):
+        """
+        Positions of the rows dated from start to end (both included), in their sheet order.
+        """
+        lo = np.searchsorted(self.days, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(self.days, np.datetime64(end, "D"), side="right")
+        return np.sort(self.order[lo:hi])
+
+class TimeSeries:
+    """
+    Prefix sums of the daily counts in SERIES, from the first to the last date of the dataset.
+
+    cumulative[name][i] is the count before day i, so the count from day a to day b (included)
+    is cumulative[name][b + 1] - cumulative[name][a].
+    """
+    @profiling.timed("derive")
+    def __init__(self, apps, interviews=None):
+        # Held so the id in the cache key (see series) can't be reused while this is cached
+        self.interviews = interviews
+        self.app_rows = DateRows(apps["Date"])
+        self.interview_rows = DateRows(interviews["Date"]) if interviews is not None and "Date" in interviews.columns else None
+        days = [rows.days for rows in [self.app_rows, self.interview_rows] if rows is not None and len(rows)]
+        if not days:
+            raise ValueError("No dates to build a time series from")
+        self.first = min(d[0] for d in days)
+        self.last = max(d[-1] for d in days)
+        n_days = int((self.last - self.first) // DAY) + 1
+
+        statuses = status.index(apps) if "Status" in apps.columns else None
+        offsets = ((self.app_rows.days - self.first) // DAY).astype(np.int64)
+        counted = {
+            "applications": np.ones(len(offsets), dtype=bool),
+            "responses": statuses.mask("All")[self.app_rows.order] if statuses is not None else np.zeros(len(offsets), dtype=bool),
+            "real_responses": statuses.mask("Real")[self.app_rows.order] if statuses is not None else np.zeros(len(offsets), dtype=bool),
+        }
+        daily = {name: np.bincount(offsets[mask], minlength=n_days) for name, mask in counted.items()}
+        if self.interview_rows is not None:
+            daily["interviews"] = np.bincount(((self.interview_rows.days - self.first) // DAY).astype(np.int64), minlength=n_days)
+        else:
+            daily["interviews"] = np.zeros(n_days, dtype=np.int64)
+        self.cumulative = {name: np.concatenate([[0], np.cumsum(counts)]) for name, counts in daily.items()}
+
+    def __len__(self):
+        return len(self.cumulative["applications"]) - 1
+
+    # Day index of a date, clipped to the calendar
+    def offset(self, date):
+        return int(np.clip((np.datetime64(date, "D") - self.first) // DAY, -1, len(self)))
+
+    def total(self, name, start, end):
+        """
+        Count of a series from start to end, both included. O(1).
+        """
+        lo, hi = max(self.offset(start), 0), min(self.offset(end), len(self) - 1)
+        if hi < lo:
+            return 0
+        cumulative = self.cumulative[name]
+        return int(cumulative[hi + 1] - cumulative[lo])
+
+    def window(self, start, end):
+        """
+        Every series' count from start to end, as a dict of name -> count.
+        """
+        return {name: self.total(name, start, end) for name in SERIES}
+
+    def rolling(self, weeks, start=None, end=None):
+        """
+        Trailing totals over `weeks` weeks and the response rates of the applications in them, at
+        the end of every week counted back from end.
+
+        Args:
+            weeks: Length of the trailing window
+            start, end: Dates the week ends are limited to, default the whole calendar
+        Returns:
+            DataFrame with columns date (the week's last day), weeks, the SERIES totals and
+            response_rate / real_response_rate in % (NaN without applications)
+        """
+        lo = max(self.offset(start), 0) if start is not None else 0
+        hi = min(self.offset(end), len(self) - 1) if end is not None else len(self) - 1
+        if hi < lo:
+            return pd.DataFrame(columns=["date", "weeks"] + SERIES + ["response_rate", "real_response_rate"])
+        ends = np.arange(hi, lo - 1, -7)[::-1]
+        starts = np.maximum(ends - 7 * weeks + 1, 0)
+        totals = {name: self.cumulative[name][ends + 1] - self.cumulative[name][starts] for name in SERIES}
+        applications = totals["applications"].astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = {
+                "response_rate": np.where(applications > 0, totals["responses"] / applications * 100, np.nan),
+                "real_response_rate": np.where(applications > 0, totals["real_responses"] / applications * 100, np.nan),
+            }
+        return pd.DataFrame({"date": self.first + ends * DAY, "weeks": weeks, **totals, **rates})
+
+# ---------------------------------------- FUNCTIONS
+
+# Dates as a datetime64[D] array, NaT where missing
+def to_days(dates):
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    return dates.to_numpy(dtype="datetime64[D]")
+
+# The time series of a dataset, built once per loaded workbook
+def series(apps, interviews=None):
+    return loader.derived(apps, ("timeseries", id(interviews)), lambda: TimeSeries(apps, interviews))